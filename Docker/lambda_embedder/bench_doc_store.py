@@ -0,0 +1,74 @@
+"""Bytes per upsert and per query with full_text inline vs in the document store.
+
+    python bench_doc_store.py --posts 500 --top-k 5
+"""
+import os
+import json
+import random
+import argparse
+import tempfile
+import time
+
+from bench_embeddings import make_synthetic_posts
+import gen_embeddings
+from doc_store import SQLiteDocStore
+from pinecone_upsert import vector_size_bytes
+from vector_store import LocalVectorStore
+
+
+def response_bytes(result):
+    return len(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--comments", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    records = gen_embeddings.build_records(make_synthetic_posts(args.posts, args.comments))
+    # Random vectors stand in for embeddings; only payload size and lookups matter here
+    vectors = [
+        {"id": r["id"], "values": [rng.gauss(0, 1) for _ in range(gen_embeddings.EMBEDDING_DIM)],
+         "metadata": r["metadata"]}
+        for r in records
+    ]
+
+    workdir = tempfile.mkdtemp()
+    doc_store = SQLiteDocStore(os.path.join(workdir, "docs.db"))
+    slim = gen_embeddings.offload_texts(vectors, doc_store)
+
+    inline_upsert = sum(vector_size_bytes(v) for v in vectors) / len(vectors)
+    slim_upsert = sum(vector_size_bytes(v) for v in slim) / len(slim)
+    print(f"upsert bytes/vector : inline {inline_upsert:8.0f}  offloaded {slim_upsert:8.0f}  "
+          f"({1 - slim_upsert / inline_upsert:.0%} smaller)")
+
+    inline_index = LocalVectorStore(os.path.join(workdir, "inline"), use_faiss=False)
+    slim_index = LocalVectorStore(os.path.join(workdir, "slim"), use_faiss=False)
+    inline_index.upsert(vectors)
+    slim_index.upsert(slim)
+    inline_index.flush()
+    slim_index.flush()
+
+    inline_bytes = slim_bytes = fetched_bytes = 0
+    fetch_time = 0.0
+    for _ in range(args.queries):
+        q = rng.choice(vectors)["values"]
+        inline_bytes += response_bytes(inline_index.query(vector=q, top_k=args.top_k, include_metadata=True))
+        result = slim_index.query(vector=q, top_k=args.top_k, include_metadata=True)
+        slim_bytes += response_bytes(result)
+        start = time.perf_counter()
+        texts = doc_store.get_many([m["id"] for m in result["matches"]])
+        fetch_time += time.perf_counter() - start
+        fetched_bytes += sum(len(t.encode("utf-8")) for t in texts.values())
+
+    n = args.queries
+    print(f"query response bytes: inline {inline_bytes / n:8.0f}  offloaded {slim_bytes / n:8.0f}  "
+          f"(+{fetched_bytes / n:.0f} bytes text fetched in {fetch_time / n * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Throughput benchmark: per-item vs batched encoding on a synthetic Reddit corpus.
+
+Run inside the embedder image (or any env with the model cached):
+
+    python bench_embeddings.py --posts 200 --comments 5 --batch-size 64
+"""
+import os
+import random
+import argparse
+import time
+
+# gen_embeddings reads these at import time; the benchmark never touches S3/Pinecone
+os.environ.setdefault("PINECONE_API_KEY", "bench")
+os.environ.setdefault("INDEX_NAME", "bench")
+os.environ.setdefault("S3_BUCKET_NAME", "bench")
+os.environ.setdefault("S3_PREFIX", "reddit_data/bench")
+
+import gen_embeddings  # noqa: E402
+
+WORDS = [
+    "bleed", "build", "katana", "rivers", "of", "blood", "faith", "strength", "dexterity",
+    "arcane", "incantation", "sorcery", "talisman", "venomous", "fang", "poison", "dlc",
+    "erdtree", "shadow", "messmer", "boss", "parry", "shield", "greatsword", "ash", "war",
+    "spirit", "mimic", "tear", "flask", "weapon", "scaling", "affinity", "occult", "the",
+    "with", "and", "for", "is", "best", "run", "[link](https://example.com)", "stats"
+]
+
+
+def make_synthetic_posts(n_posts, comments_per_post, seed=0, start=0):
+    """Generate posts in the fetch_subreddit_threads schema with a realistic length spread.
+
+    start offsets post ids and timestamps, so successive calls yield distinct posts.
+    """
+    rng = random.Random(seed)
+
+    def sentence(lo, hi):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+
+    posts = []
+    for i in range(start, start + n_posts):
+        posts.append({
+            "id": f"synth{i:06d}",
+            "title": sentence(4, 12),
+            "body": sentence(10, 300),
+            "comments": [sentence(3, 120) for _ in range(comments_per_post)],
+            "metadata": {
+                "subreddit": "EldenringBuilds",
+                "url": f"https://reddit.com/r/EldenringBuilds/synth{i:06d}",
+                "author": f"user{rng.randint(0, 999)}",
+                "timestamp": 1718000000 + i * 60,
+            }
+        })
+    return posts
+
+
+def bench_per_item(records):
+    start = time.perf_counter()
+    for r in records:
+        gen_embeddings.generate_embeddings(r["text"])
+    return time.perf_counter() - start
+
+
+def bench_batched(records, batch_size):
+    start = time.perf_counter()
+    gen_embeddings.embed_records(records, batch_size=batch_size)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--comments", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    records = gen_embeddings.build_records(make_synthetic_posts(args.posts, args.comments, args.seed))
+    print(f"[INFO] Synthetic corpus: {len(records)} texts, model={gen_embeddings.EMBEDDING_MODEL}")
+
+    # Warm up so model load time is not charged to either path
+    gen_embeddings.generate_embeddings("warm up")
+
+    per_item = bench_per_item(records)
+    print(f"per-item        : {per_item:8.2f}s  {len(records) / per_item:8.1f} texts/s")
+    for bs in args.batch_size:
+        batched = bench_batched(records, bs)
+        print(f"batched (bs={bs:<4}): {batched:8.2f}s  {len(records) / batched:8.1f} texts/s  "
+              f"speedup x{per_item / batched:.2f}")
+
+
+if __name__ == "__main__":
+    main()
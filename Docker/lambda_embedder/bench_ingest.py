@@ -0,0 +1,234 @@
+"""End-to-end ingest benchmark: process_s3_files over synthetic Reddit corpora at several scales.
+
+Each scale runs in a fresh process that uploads synthetic scrape files (the
+fetch_subreddit_threads schema, keyed and serialized like save_to_s3) to an S3
+stand-in, then runs gen_embeddings.process_s3_files into a LocalVectorStore in a
+temp directory. Reported per scale: docs/s (texts built from posts and comments),
+peak RSS, and the per-stage time breakdown from process_s3_files.
+
+The S3 stand-in is in-process moto by default; it keeps the corpus in the measured
+process, so peak RSS includes corpus_mb. Point --s3-endpoint at MinIO or moto_server
+to measure the embedder alone. --hash-encoder replaces the model with whitespace
+tokens and seeded random vectors, so million-document runs time everything but the
+encoder in minutes:
+
+    python bench_ingest.py --docs 1000
+    python bench_ingest.py --docs 1000 100000 1000000 --hash-encoder --output ingest.json
+    python bench_ingest.py --docs 1000 100000 --hash-encoder --baseline ingest.json --tolerance 0.2
+"""
+import io
+import os
+import re
+import sys
+import json
+import zlib
+import argparse
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Stages on the main ingest thread; fetch/parse overlap them on the prefetch pool
+MAIN_STAGES = ("wait", "build", "chunk", "dedup", "bm25", "encode", "docstore", "upsert")
+TOKEN_RE = re.compile(r"\S+")
+
+
+class HashEncoder:
+    """Model-free encoder: whitespace token offsets and a per-text seeded random vector."""
+
+    max_seq_length = 384
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def tokenizer(self, texts, **kwargs):
+        return {"offset_mapping": [[m.span() for m in TOKEN_RE.finditer(t)] for t in texts]}
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else sentences
+        vectors = np.stack([
+            np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(self.dim, dtype=np.float32)
+            for t in texts
+        ])
+        return vectors[0] if single else vectors
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def upload_corpus(s3, bucket, prefix, n_docs, comments, posts_per_file, seed):
+    """Write ceil(n_docs / (1 + comments)) posts as scrape files; returns (files, texts, bytes)."""
+    from bench_embeddings import make_synthetic_posts
+
+    n_posts = -(-n_docs // (1 + comments))
+    scraped_at = datetime(2024, 6, 10)
+    files, size = 0, 0
+    for start in range(0, n_posts, posts_per_file):
+        posts = make_synthetic_posts(min(posts_per_file, n_posts - start), comments, seed=seed + files, start=start)
+        body = json.dumps(posts, indent=2)
+        stamp = (scraped_at + timedelta(hours=files)).strftime("%Y-%m-%d_%H-%M-%S")
+        s3.put_object(Bucket=bucket, Key=f"{prefix}EldenringBuilds_{stamp}.json", Body=body,
+                      ContentType="application/json")
+        files += 1
+        size += len(body)
+    return files, n_posts * (1 + comments), size
+
+
+def run_scale(n_docs, options):
+    """Runs in a spawned process, so gen_embeddings sees this scale's environment and peak RSS is its own."""
+    workdir = tempfile.mkdtemp(prefix=f"ingest_{n_docs}_")
+    bucket = options["bucket"]
+    prefix = f"reddit_data/bench_{n_docs}/"
+    os.environ.update({
+        "PINECONE_API_KEY": "bench",
+        "INDEX_NAME": "bench",
+        "S3_BUCKET_NAME": bucket,
+        "S3_PREFIX": prefix,
+        "VECTOR_STORE": "local",
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "index"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25.npz") if options["bm25"] else "",
+        "UPSERT_DEAD_LETTER_PATH": os.path.join(workdir, "dead_letter_upserts.jsonl"),
+    })
+    if options["s3_endpoint"]:
+        os.environ["AWS_ENDPOINT_URL"] = options["s3_endpoint"]
+    else:
+        from moto import mock_aws
+        for var in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+            os.environ.setdefault(var, "bench")
+        mock_aws().start()
+
+    # Imported only now: gen_embeddings creates its S3 client and reads its config at import time
+    import gen_embeddings
+
+    s3 = gen_embeddings.s3_client
+    try:
+        s3.create_bucket(Bucket=bucket)
+    except (s3.exceptions.BucketAlreadyOwnedByYou, s3.exceptions.BucketAlreadyExists):
+        pass
+    n_files, n_texts, corpus_bytes = upload_corpus(s3, bucket, prefix, n_docs, options["comments"],
+                                                   options["posts_per_file"], options["seed"])
+
+    if options["hash_encoder"]:
+        gen_embeddings.model = HashEncoder(gen_embeddings.EMBEDDING_DIM)
+    with contextlib.redirect_stdout(io.StringIO()):
+        gen_embeddings.get_model().encode("warm up")
+    rss_before = peak_rss_mb()
+
+    with open(os.path.join(workdir, "ingest.log"), "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        summary = gen_embeddings.process_s3_files(bucket, prefix, latest_only=False,
+                                                  files_per_encode=options["files_per_encode"])
+    stage_times = summary["stage_times"]
+    return {
+        "docs": n_docs,
+        "files": n_files,
+        "texts": n_texts,
+        "chunks": summary["chunks"],
+        "vectors": summary["vectors"],
+        "wall_time": summary["wall_time"],
+        "docs_per_s": n_texts / max(summary["wall_time"], 1e-9),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": rss_before,
+        "corpus_mb": corpus_bytes / (1024 * 1024) if not options["s3_endpoint"] else 0.0,
+        "stage_times": {
+            **stage_times,
+            "other": max(0.0, summary["wall_time"] - sum(stage_times.get(s, 0.0) for s in MAIN_STAGES)),
+        },
+        "dedup_dropped": summary["dedup"].get("dropped", 0),
+        "complete": summary["complete"],
+        "log": os.path.join(workdir, "ingest.log"),
+    }
+
+
+def print_results(results):
+    print(f"{'docs':>9} {'files':>6} {'vectors':>9} {'wall s':>8} {'docs/s':>9} "
+          f"{'peak MB':>8} {'pre MB':>7} {'corpus MB':>9}")
+    for r in results:
+        print(f"{r['docs']:>9} {r['files']:>6} {r['vectors']:>9} {r['wall_time']:>8.1f} {r['docs_per_s']:>9.1f} "
+              f"{r['peak_rss_mb']:>8.0f} {r['rss_before_mb']:>7.0f} {r['corpus_mb']:>9.0f}")
+    stages = MAIN_STAGES + ("other", "fetch", "parse")
+    print("\nStage seconds (share of wall; fetch/parse run on the prefetch pool):")
+    print(f"{'docs':>9} " + " ".join(f"{s:>13}" for s in stages))
+    for r in results:
+        cells = [f"{r['stage_times'].get(s, 0.0):7.1f} ({r['stage_times'].get(s, 0.0) / max(r['wall_time'], 1e-9):3.0%})"
+                 for s in stages]
+        print(f"{r['docs']:>9} " + " ".join(f"{c:>13}" for c in cells))
+
+
+def check_regressions(results, baseline_path, tolerance):
+    """Compare docs/s and peak RSS with a previous --output file; returns the regressions found."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["docs"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["docs"])
+        if base is None:
+            continue
+        throughput = r["docs_per_s"] / base["docs_per_s"] - 1
+        memory = r["peak_rss_mb"] / base["peak_rss_mb"] - 1
+        print(f"[INFO] {r['docs']} docs vs baseline: docs/s {throughput:+.1%}, peak RSS {memory:+.1%}")
+        if throughput < -tolerance:
+            regressions.append(f"{r['docs']} docs: docs/s {throughput:+.1%}")
+        if memory > tolerance:
+            regressions.append(f"{r['docs']} docs: peak RSS {memory:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[1000],
+                        help="scales in texts (post bodies + comments); the suite is 1000 100000 1000000")
+    parser.add_argument("--comments", type=int, default=5, help="comments per post (lambda_handler scrapes 5)")
+    parser.add_argument("--posts-per-file", type=int, default=10, help="posts per scrape file (lambda_handler: 10)")
+    parser.add_argument("--files-per-encode", type=int, default=int(os.environ.get("FILES_PER_ENCODE", "1")))
+    parser.add_argument("--hash-encoder", action="store_true", help="skip the model to time the rest of the pipeline")
+    parser.add_argument("--no-bm25", dest="bm25", action="store_false", help="do not build the BM25 index")
+    parser.add_argument("--s3-endpoint", default="", help="MinIO / moto_server URL instead of in-process moto")
+    parser.add_argument("--bucket", default="ingest-bench")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON, e.g. to use as a later --baseline")
+    parser.add_argument("--baseline", help="earlier --output file; exit 1 if a scale regresses beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    options = {
+        "comments": args.comments,
+        "posts_per_file": args.posts_per_file,
+        "files_per_encode": args.files_per_encode,
+        "hash_encoder": args.hash_encoder,
+        "bm25": args.bm25,
+        "s3_endpoint": args.s3_endpoint,
+        "bucket": args.bucket,
+        "seed": args.seed,
+    }
+    results = []
+    for n_docs in args.docs:
+        print(f"[INFO] Ingesting {n_docs} synthetic docs...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(run_scale, n_docs, options).result()
+        print(f"[INFO] {n_docs} docs: {result['docs_per_s']:.1f} docs/s, peak RSS {result['peak_rss_mb']:.0f} MB "
+              f"(log: {result['log']})", flush=True)
+        results.append(result)
+
+    print()
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+        print(f"[INFO] Wrote {args.output}")
+    if args.baseline:
+        regressions = check_regressions(results, args.baseline, args.tolerance)
+        if regressions:
+            print("[REGRESSION] " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
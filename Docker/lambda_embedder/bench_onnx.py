@@ -0,0 +1,95 @@
+"""Accuracy vs speed of the ONNX embedding backends against float32 PyTorch.
+
+Recall@k is the overlap between each backend's top-k and the float32 top-k for
+the evaluator's test queries, both with the corpus re-embedded by the backend
+("full") and with only the query side switched against a float32 index
+("query-only", i.e. rag_utils moved before the index is rebuilt). Use a real
+scrape file for meaningful recall; the synthetic corpus only measures speed.
+
+    python bench_onnx.py --corpus EldenringBuilds_2024-06-10_12-00-00.json --threads 1 4
+"""
+import os
+import json
+import argparse
+import time
+
+import numpy as np
+
+from bench_embeddings import make_synthetic_posts
+import gen_embeddings
+from onnx_encoder import load_encoder
+
+
+def top_k(doc_matrix, query_matrix, k):
+    scores = query_matrix @ doc_matrix.T
+    return [set(row) for row in np.argsort(-scores, axis=1)[:, :k]]
+
+
+def recall_at_k(results, baseline, k):
+    return float(np.mean([len(r & b) / k for r, b in zip(results, baseline)]))
+
+
+def embed(encoder, texts, batch_size):
+    """Encode through gen_embeddings' length-sorted batching; returns (matrix, seconds)."""
+    gen_embeddings.model = encoder
+    start = time.perf_counter()
+    vectors = gen_embeddings.encode_batched(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", default=os.path.join("..", "lambda_evaluate", "test_queries.json"))
+    parser.add_argument("--corpus", nargs="*", default=[], help="scrape JSON files; synthetic posts if omitted")
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--comments", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--batch-size", type=int, default=gen_embeddings.EMBED_BATCH_SIZE)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--cache-folder", default="/app/cache" if os.path.isdir("/app/cache") else "./cache")
+    args = parser.parse_args()
+
+    posts = []
+    for path in args.corpus:
+        with open(path, "r", encoding="utf-8") as f:
+            posts.extend(json.load(f))
+    if not posts:
+        posts = make_synthetic_posts(args.posts, args.comments)
+    texts = [r["text"] for r in gen_embeddings.build_records(posts)]
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [case["query"] for case in json.load(f)]
+    print(f"[INFO] {len(texts)} texts, {len(queries)} queries, model={gen_embeddings.EMBEDDING_MODEL}")
+
+    baseline_encoder = load_encoder(gen_embeddings.EMBEDDING_MODEL, "torch", args.cache_folder, args.threads[0])
+    baseline_encoder.encode("warm up")
+    base_docs, base_time = embed(baseline_encoder, texts, args.batch_size)
+    base_queries, _ = embed(baseline_encoder, queries, args.batch_size)
+    baseline = top_k(base_docs, base_queries, args.k)
+    print(f"{'backend':<10} {'threads':>7} {'texts/s':>9} {'speedup':>8} {'cos(fp32)':>10} "
+          f"{'recall@' + str(args.k) + ' full':>15} {'query-only':>11} {'query ms':>9}")
+    print(f"{'torch':<10} {args.threads[0]:>7} {len(texts) / base_time:>9.1f} {1.0:>8.2f} {1.0:>10.4f} "
+          f"{1.0:>15.3f} {1.0:>11.3f} {'':>9}")
+
+    for backend in args.backends:
+        for threads in args.threads:
+            encoder = load_encoder(gen_embeddings.EMBEDDING_MODEL, backend, args.cache_folder, threads)
+            encoder.encode("warm up")
+            docs, elapsed = embed(encoder, texts, args.batch_size)
+            query_matrix, _ = embed(encoder, queries, args.batch_size)
+            start = time.perf_counter()
+            for q in queries:
+                encoder.encode(q)
+            query_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+            cosine = float(np.mean(np.sum(docs * base_docs, axis=1)))
+            full = recall_at_k(top_k(docs, query_matrix, args.k), baseline, args.k)
+            query_only = recall_at_k(top_k(base_docs, query_matrix, args.k), baseline, args.k)
+            print(f"{backend:<10} {threads:>7} {len(texts) / elapsed:>9.1f} {base_time / elapsed:>8.2f} "
+                  f"{cosine:>10.4f} {full:>15.3f} {query_only:>11.3f} {query_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Upsert engine benchmark against a local fake index with injected latency and failures.
+
+    python bench_upsert.py --vectors 5000 --latency-ms 80 --failure-rate 0.1
+"""
+import os
+import random
+import argparse
+import tempfile
+import threading
+import time
+
+from pinecone_upsert import upsert_vectors
+
+
+class FakeIndex:
+    """Stand-in for a Pinecone index: sleeps per request and fails a fraction of them."""
+
+    def __init__(self, latency_s=0.05, failure_rate=0.0, seed=0):
+        self.latency_s = latency_s
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.vectors = {}
+        self.requests = 0
+
+    def upsert(self, vectors):
+        time.sleep(self.latency_s)
+        with self.lock:
+            self.requests += 1
+            fail = self.rng.random() < self.failure_rate
+        if fail:
+            raise RuntimeError("503 Service Unavailable (injected)")
+        with self.lock:
+            for v in vectors:
+                self.vectors[v["id"]] = v
+        return {"upserted_count": len(vectors)}
+
+
+def make_vectors(n, dim, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"synth{i:06d}-comment-0",
+            "values": [rng.random() for _ in range(dim)],
+            "metadata": {"type": "comment", "full_text": "x" * rng.randint(20, 4000)},
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dim)
+    dead_letter = os.path.join(tempfile.mkdtemp(), "dead_letter.jsonl")
+    for concurrency in args.concurrency:
+        index = FakeIndex(latency_s=args.latency_ms / 1000, failure_rate=args.failure_rate)
+        start = time.perf_counter()
+        summary = upsert_vectors(index, vectors, concurrency=concurrency, base_delay=0.05,
+                                 dead_letter_path=dead_letter)
+        elapsed = time.perf_counter() - start
+        print(f"concurrency={concurrency:<3} {elapsed:7.2f}s  {len(vectors) / elapsed:8.1f} vec/s  "
+              f"batches={summary['batches']} retries={summary['retries']} "
+              f"stored={len(index.vectors)} dead_lettered={len(summary['failed_ids'])}")
+
+
+if __name__ == "__main__":
+    main()
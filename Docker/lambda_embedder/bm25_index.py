@@ -0,0 +1,192 @@
+import io
+import re
+from collections import Counter
+
+import boto3
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens; keeps item names like "rivers of blood" matchable word by word."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """BM25 over vector ids, stored as CSR-style postings in a single .npz.
+
+    terms is sorted, so a query term is found with searchsorted and its postings
+    are postings_docs/postings_tf[term_offsets[t]:term_offsets[t + 1]]. Loading is
+    a handful of array reads, with no per-term Python objects. add(), remove() and
+    merge() go through an editable term-frequency form that is re-packed on save().
+
+    Removed ids are kept in removed_ids and saved with the index, so merge() can
+    apply a shard's deletions as well as its additions.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75, region_name="us-east-1"):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.region_name = region_name
+        self.doc_ids = np.array([], dtype=str)
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.terms = np.array([], dtype=str)
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.zeros(0, dtype=np.int32)
+        self.postings_tf = np.zeros(0, dtype=np.uint16)
+        self.doc_terms = None  # id -> Counter, only materialized when editing
+        self.removed_ids = set()
+
+    def __len__(self):
+        return len(self.doc_terms) if self.doc_terms is not None else len(self.doc_ids)
+
+    # ---------------------- building ----------------------
+
+    def _editable(self):
+        if self.doc_terms is None:
+            self.doc_terms = {str(vid): Counter() for vid in self.doc_ids}
+            for t, term in enumerate(self.terms):
+                start, end = self.term_offsets[t], self.term_offsets[t + 1]
+                for doc, tf in zip(self.postings_docs[start:end], self.postings_tf[start:end]):
+                    self.doc_terms[str(self.doc_ids[doc])][str(term)] = int(tf)
+        return self.doc_terms
+
+    def add(self, texts):
+        """Index {vector_id: text}, replacing any earlier text for the same id."""
+        doc_terms = self._editable()
+        for vid, text in texts.items():
+            doc_terms[vid] = Counter(tokenize(text))
+            self.removed_ids.discard(vid)
+
+    def remove(self, ids):
+        """Drop ids from the index; document lengths and the average length follow on the next pack."""
+        doc_terms = self._editable()
+        for vid in ids:
+            doc_terms.pop(vid, None)
+            self.removed_ids.add(vid)
+
+    def merge(self, other):
+        self.remove(other.removed_ids)
+        added = other._editable()
+        self._editable().update(added)
+        self.removed_ids.difference_update(added)
+
+    def _pack(self):
+        doc_terms = self.doc_terms
+        self.doc_ids = np.array(list(doc_terms.keys()), dtype=str)
+        self.doc_len = np.array([sum(c.values()) for c in doc_terms.values()], dtype=np.int32)
+        postings = {}
+        for doc, counts in enumerate(doc_terms.values()):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, min(tf, np.iinfo(np.uint16).max)))
+        self.terms = np.array(sorted(postings), dtype=str)
+        lengths = [len(postings[t]) for t in self.terms]
+        self.term_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        flat = [p for t in self.terms for p in postings[t]]
+        self.postings_docs = np.array([d for d, _ in flat], dtype=np.int32)
+        self.postings_tf = np.array([tf for _, tf in flat], dtype=np.uint16)
+
+    # ---------------------- querying ----------------------
+
+    def search(self, query, top_k=20):
+        """[(vector_id, bm25 score)] best first; an empty list when nothing matches."""
+        if self.doc_terms is not None:
+            self._pack()
+            self.doc_terms = None
+        n_docs = len(self.doc_ids)
+        if not n_docs or not len(self.terms):
+            return []
+        avg_len = max(float(self.doc_len.mean()), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / avg_len)
+        scores = np.zeros(n_docs, dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            t = int(np.searchsorted(self.terms, term))
+            if t >= len(self.terms) or self.terms[t] != term:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        k = min(top_k, len(hits))
+        best = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(str(self.doc_ids[i]), float(scores[i])) for i in best]
+
+    # ---------------------- persistence ----------------------
+
+    def _is_s3(self):
+        return self.path.startswith("s3://")
+
+    def _s3_location(self):
+        bucket, _, key = self.path[len("s3://"):].partition("/")
+        return bucket, key
+
+    def load(self):
+        try:
+            if self._is_s3():
+                bucket, key = self._s3_location()
+                s3 = boto3.client("s3", region_name=self.region_name)
+                try:
+                    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+                except s3.exceptions.NoSuchKey:
+                    print(f"[INFO] No BM25 index at {self.path}, starting empty")
+                    return self
+                blob = np.load(io.BytesIO(body))
+            else:
+                blob = np.load(self.path)
+        except FileNotFoundError:
+            print(f"[INFO] No BM25 index at {self.path}, starting empty")
+            return self
+
+        self.doc_ids = blob["doc_ids"]
+        self.doc_len = blob["doc_len"]
+        self.terms = blob["terms"]
+        self.term_offsets = blob["term_offsets"]
+        self.postings_docs = blob["postings_docs"]
+        self.postings_tf = blob["postings_tf"]
+        self.removed_ids = set(blob["removed_ids"].tolist()) if "removed_ids" in blob else set()
+        self.doc_terms = None
+        print(f"[INFO] Loaded BM25 index ({len(self.doc_ids)} docs, {len(self.terms)} terms) from {self.path}")
+        return self
+
+    def save(self):
+        """Write the index; False if the write failed (the error is logged, not raised)."""
+        if self.doc_terms is not None:
+            self._pack()
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, doc_ids=self.doc_ids, doc_len=self.doc_len, terms=self.terms,
+                            term_offsets=self.term_offsets, postings_docs=self.postings_docs,
+                            postings_tf=self.postings_tf,
+                            removed_ids=np.array(sorted(self.removed_ids), dtype=str))
+        try:
+            if self._is_s3():
+                bucket, key = self._s3_location()
+                s3 = boto3.client("s3", region_name=self.region_name)
+                s3.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
+            else:
+                with open(self.path, "wb") as f:
+                    f.write(buffer.getvalue())
+            print(f"[INFO] Saved BM25 index ({len(self.doc_ids)} docs, {len(self.terms)} terms, "
+                  f"{len(buffer.getvalue()) / 1024:.0f} KB) to {self.path}")
+        except Exception as e:
+            print(f"[ERROR] Failed to save BM25 index {self.path}: {e}")
+            return False
+        return True
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank). Returns ids best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, vid in enumerate(ranking, start=1):
+            scores[vid] = scores.get(vid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
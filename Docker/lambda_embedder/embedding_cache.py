@@ -0,0 +1,161 @@
+import io
+import json
+import hashlib
+from collections import OrderedDict
+
+import boto3
+import numpy as np
+
+
+def text_key(model_name, text):
+    """Cache key for a cleaned text under a given embedding model."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class EmbeddingCache:
+    """Size-bounded LRU cache of text embeddings persisted to a local file or S3.
+
+    Each entry remembers the vector ids it has already been upserted under, so
+    a re-scraped post with unchanged text can skip both the encoder and Pinecone.
+    Vectors live in one float32 [rows, dim] matrix with an LRU-ordered key -> row
+    map, so 200k entries take ~600 MB at 768 dimensions instead of Python float
+    lists; an evicted entry's row is reused by the next new key.
+    """
+
+    def __init__(self, path, max_entries=200000, region_name="us-east-1"):
+        self.path = path
+        self.max_entries = max_entries
+        self.region_name = region_name
+        self.rows = OrderedDict()  # key -> row, least recently used first
+        self.values = None         # float32 [capacity, dim], grown on demand
+        self.vector_ids = []       # row -> ids the vector was upserted under
+        self.hits = 0
+        self.misses = 0
+        self.upserts_skipped = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    # ---------------------- lookups ----------------------
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            self.misses += 1
+            return None
+        self.rows.move_to_end(key)
+        self.hits += 1
+        return {"values": self.values[row].tolist(), "ids": self.vector_ids[row]}
+
+    def _new_row(self, dim):
+        if len(self.rows) >= self.max_entries:
+            return self.rows.popitem(last=False)[1]
+        row = len(self.vector_ids)
+        if self.values is None:
+            self.values = np.empty((min(self.max_entries, 1024), dim), dtype=np.float32)
+        elif row == len(self.values):
+            grown = np.empty((min(self.max_entries, 2 * row), dim), dtype=np.float32)
+            grown[:row] = self.values
+            self.values = grown
+        self.vector_ids.append([])
+        return row
+
+    def put(self, key, vector, vector_id):
+        if self.max_entries <= 0:
+            return
+        row = self.rows.get(key)
+        if row is None:
+            row = self._new_row(len(vector))
+            self.rows[key] = row
+            self.vector_ids[row] = []
+        else:
+            self.rows.move_to_end(key)
+        self.values[row] = vector
+        if vector_id not in self.vector_ids[row]:
+            self.vector_ids[row].append(vector_id)
+
+    def forget_ids(self, vector_ids):
+        """Drop ids deleted from the index, so their texts are upserted again if they come back."""
+        vector_ids = set(vector_ids)
+        for row in self.rows.values():
+            if vector_ids.intersection(self.vector_ids[row]):
+                self.vector_ids[row] = [vid for vid in self.vector_ids[row] if vid not in vector_ids]
+
+    def merge(self, other):
+        """Add every entry of another cache (e.g. a backfill shard), keeping its vector ids."""
+        for key, row in other.rows.items():
+            for vector_id in other.vector_ids[row]:
+                self.put(key, other.values[row], vector_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "upserts_skipped": self.upserts_skipped,
+        }
+
+    # ---------------------- persistence ----------------------
+
+    def _is_s3(self):
+        return self.path.startswith("s3://")
+
+    def _s3_location(self):
+        bucket, _, key = self.path[len("s3://"):].partition("/")
+        return bucket, key
+
+    def load(self):
+        try:
+            if self._is_s3():
+                bucket, key = self._s3_location()
+                s3 = boto3.client("s3", region_name=self.region_name)
+                try:
+                    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+                except s3.exceptions.NoSuchKey:
+                    print(f"[INFO] No embedding cache at {self.path}, starting empty")
+                    return self
+                blob = np.load(io.BytesIO(body))
+            else:
+                blob = np.load(self.path)
+        except FileNotFoundError:
+            print(f"[INFO] No embedding cache at {self.path}, starting empty")
+            return self
+        except Exception as e:
+            print(f"[WARN] Failed to load embedding cache {self.path}, starting empty: {e}")
+            return self
+
+        keys = blob["keys"]
+        # Saved least recently used first, so a smaller max_entries keeps the most recent
+        skip = max(len(keys) - self.max_entries, 0)
+        self.rows = OrderedDict((str(key), row) for row, key in enumerate(keys[skip:]))
+        self.values = np.asarray(blob["values"][skip:], dtype=np.float32) if self.rows else None
+        self.vector_ids = json.loads(str(blob["ids"]))[skip:]
+        print(f"[INFO] Loaded {len(self.rows)} cached embeddings from {self.path}")
+        return self
+
+    def save(self):
+        """Write the cache; False if the write failed (the error is logged, not raised)."""
+        if not self.rows:
+            return True
+        keys = np.array(list(self.rows.keys()))
+        order = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        values = self.values[order]
+        ids = np.array(json.dumps([self.vector_ids[row] for row in order]))
+        buffer = io.BytesIO()
+        np.savez(buffer, keys=keys, values=values, ids=ids)
+        try:
+            if self._is_s3():
+                bucket, key = self._s3_location()
+                s3 = boto3.client("s3", region_name=self.region_name)
+                s3.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
+            else:
+                with open(self.path, "wb") as f:
+                    f.write(buffer.getvalue())
+            print(f"[INFO] Saved {len(self.rows)} cached embeddings to {self.path}")
+        except Exception as e:
+            print(f"[ERROR] Failed to save embedding cache {self.path}: {e}")
+            return False
+        return True
@@ -2,10 +2,22 @@ import os
 import json
 import re
 import argparse
+import time
+import zlib
+import threading
+import multiprocessing
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime, timezone
 
 import boto3
-from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache, text_key
+from bm25_index import BM25Index
+from near_dup import SignatureStore
+from pinecone_upsert import upsert_vectors, vector_size_bytes
+from doc_store import open_doc_store
+from vector_store import LocalVectorStore
+from onnx_encoder import load_encoder
 from pinecone import (
     Pinecone,
     ServerlessSpec,
@@ -17,11 +29,54 @@ from pinecone import (
 PINECONE_API_KEY = os.environ["PINECONE_API_KEY"]
 PINECONE_ENV = os.environ.get("PINECONE_ENV", "us-east1-aws")
 INDEX_NAME = os.environ["INDEX_NAME"]
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "pinecone")  # pinecone | local
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "local_index")
 EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-mpnet-base-v2")
 EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", "768"))
+# torch (float32 SentenceTransformer) | onnx (ONNX Runtime float32) | onnx-int8 (dynamic int8 quantization)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))  # 0 keeps the library default
+# Quantized vectors differ slightly from float32 ones, so they get their own embedding-cache keys
+CACHE_MODEL_KEY = EMBEDDING_MODEL if EMBEDDING_BACKEND == "torch" else f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}"
 S3_BUCKET_NAME = os.environ["S3_BUCKET_NAME"]
 S3_PREFIX = os.environ["S3_PREFIX"]
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+FILES_PER_ENCODE = int(os.environ.get("FILES_PER_ENCODE", "1"))
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", "")  # local path or s3://bucket/key
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("EMBED_CACHE_MAX_ENTRIES", "200000"))
+# Chunks stay under all-mpnet-base-v2's 384-token limit so long guides are not silently truncated
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "256"))  # 0 disables chunking
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "32"))
+PREFETCH_DEPTH = int(os.environ.get("PREFETCH_DEPTH", "4"))
+UPSERT_CONCURRENCY = int(os.environ.get("UPSERT_CONCURRENCY", "4"))
+UPSERT_MAX_RETRIES = int(os.environ.get("UPSERT_MAX_RETRIES", "5"))
+# Batches that exhaust their retries; on S3 by default so they outlive the container (local .jsonl also works)
+UPSERT_DEAD_LETTER_PATH = os.environ.get(
+    "UPSERT_DEAD_LETTER_PATH", f"s3://{S3_BUCKET_NAME}/embedding_state/{INDEX_NAME}/dead_letter/"
+)
+# Ids per fetch (GET query string) and per delete when removing chunks left by an earlier chunking
+STALE_FETCH_BATCH = int(os.environ.get("STALE_FETCH_BATCH", "100"))
+STALE_DELETE_BATCH = int(os.environ.get("STALE_DELETE_BATCH", "1000"))
+# BM25 postings over the same texts for hybrid retrieval (local .npz path or s3://bucket/key; empty disables)
+BM25_INDEX_PATH = os.environ.get("BM25_INDEX_PATH", "")
+# MinHash near-duplicate texts (Jaccard over word 5-shingles >= threshold) are dropped before
+# encoding; 0 disables. Signatures persist at DEDUP_SIGNATURES_PATH (empty: this run only)
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.9"))
+DEDUP_SIGNATURES_PATH = os.environ.get("DEDUP_SIGNATURES_PATH", "")
+# When set, full_text goes to this store (sqlite path or s3://bucket/prefix) instead of vector metadata
+DOC_STORE_URI = os.environ.get("DOC_STORE_URI", "")
+INGEST_MODE = os.environ.get("INGEST_MODE", "latest")  # latest | all | incremental
+# Backfill (--mode all) worker processes per instance; each loads its own model
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", "1"))
+BACKFILL_PROGRESS_INTERVAL = float(os.environ.get("BACKFILL_PROGRESS_INTERVAL", "10"))
+# Multi-instance backfill: how long the first instance waits for the others' state files
+BACKFILL_MERGE_TIMEOUT = float(os.environ.get("BACKFILL_MERGE_TIMEOUT", "3600"))
+BACKFILL_MERGE_POLL = float(os.environ.get("BACKFILL_MERGE_POLL", "15"))
+SAGEMAKER_RESOURCE_CONFIG = "/opt/ml/config/resourceconfig.json"
+INGEST_MANIFEST_KEY = os.environ.get(
+    "INGEST_MANIFEST_KEY", f"embedding_state/{INDEX_NAME}/manifest.json"
+)
 
 # Initialize clients
 s3_client = boto3.client("s3", region_name=AWS_REGION)
@@ -33,10 +88,14 @@ def get_model():
     global model
     if model is None:
         try:
-            model = SentenceTransformer(
+            start = time.perf_counter()
+            model = load_encoder(
                 EMBEDDING_MODEL,
-                cache_folder="/app/cache"
+                backend=EMBEDDING_BACKEND,
+                cache_folder="/app/cache",
+                num_threads=EMBEDDING_THREADS or None
             )
+            print(f"[INFO] Loaded {EMBEDDING_MODEL} ({EMBEDDING_BACKEND}) in {time.perf_counter() - start:.2f}s")
         except Exception as e:
             print(f"[ERROR] Failed to load embedding model: {e}")
             raise
@@ -45,6 +104,9 @@ def get_model():
 
 def get_index():
     global pc, index
+    if index is None and VECTOR_STORE == "local":
+        index = LocalVectorStore(LOCAL_INDEX_DIR)
+        print(f"[INFO] Using local vector store at {LOCAL_INDEX_DIR}")
     if index is None:
         try:
             pc = Pinecone(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
@@ -60,13 +122,25 @@ def get_index():
                 print(f"[INFO] Created index: {INDEX_NAME}")
             else:
                 print(f"[INFO] Index {INDEX_NAME} already exists")
-            index = pc.Index(INDEX_NAME)
+            # Connection pool sized to the upsert thread pool so requests are not serialized on it
+            index = pc.Index(INDEX_NAME, pool_threads=UPSERT_CONCURRENCY)
         except Exception as e:
             print(f"[ERROR] Pinecone index setup failed: {e}")
             raise
     return index
 
 
+def vector_store_name():
+    """Where upserts go, for log lines"""
+    return f"local index {LOCAL_INDEX_DIR}" if VECTOR_STORE == "local" else f"Pinecone index {INDEX_NAME}"
+
+
+def flush_index():
+    """Persist buffered upserts for backends that need it (the local store); Pinecone writes through."""
+    if index is not None and hasattr(index, "flush"):
+        index.flush()
+
+
 def retrieve_s3_files(bucket_name, prefix, latest_only=False):
     try:
         paginator = s3_client.get_paginator("list_objects_v2")
@@ -93,6 +167,86 @@ def retrieve_s3_files(bucket_name, prefix, latest_only=False):
         return []
 
 
+def load_manifest(bucket_name, manifest_key=INGEST_MANIFEST_KEY):
+    """Load the processed-files manifest: {"watermark": last key, "processed": {key: etag}}.
+
+    "processed" only holds files past the watermark (see prune_manifest). Files
+    that can never be parsed are also listed under "failed": {key: etag}.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=manifest_key)
+        manifest = json.loads(response["Body"].read().decode("utf-8"))
+        print(f"[INFO] Loaded manifest with {len(manifest.get('processed', {}))} files, "
+              f"watermark={manifest.get('watermark')}")
+        return manifest
+    except s3_client.exceptions.NoSuchKey:
+        print(f"[INFO] No manifest at s3://{bucket_name}/{manifest_key}, starting from scratch")
+        return {"watermark": None, "processed": {}}
+
+
+def save_manifest(bucket_name, manifest, manifest_key=INGEST_MANIFEST_KEY):
+    try:
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=manifest_key,
+            Body=json.dumps(manifest, indent=2),
+            ContentType="application/json"
+        )
+    except Exception as e:
+        print(f"[ERROR] Failed to save manifest s3://{bucket_name}/{manifest_key}: {e}")
+        raise
+
+
+def mark_processed(manifest, file_key, etag, advance_watermark=True):
+    manifest["processed"][file_key] = etag
+    manifest.get("failed", {}).pop(file_key, None)
+    if not advance_watermark:
+        return
+    if manifest["watermark"] is None or file_key > manifest["watermark"]:
+        manifest["watermark"] = file_key
+
+
+def prune_manifest(manifest):
+    """Drop processed entries at or below the watermark; StartAfter never lists them again.
+
+    What remains is the files recorded past a held-back watermark, so the manifest
+    stays the size of the retry window instead of the whole scrape history.
+    """
+    watermark = manifest.get("watermark")
+    if watermark is None:
+        return
+    manifest["processed"] = {key: etag for key, etag in manifest["processed"].items() if key > watermark}
+
+
+def retrieve_new_s3_files(bucket_name, prefix, manifest):
+    """List only objects after the manifest watermark that have not been ingested yet.
+
+    Scrape keys look like reddit_data/<sub>/<sub>_<YYYY-mm-dd_HH-MM-SS>.json, so
+    lexicographic order is chronological and StartAfter skips the whole history.
+    """
+    try:
+        paginator = s3_client.get_paginator("list_objects_v2")
+        params = {"Bucket": bucket_name, "Prefix": prefix}
+        if manifest.get("watermark"):
+            params["StartAfter"] = manifest["watermark"]
+
+        new_files = []
+        for page in paginator.paginate(**params):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if not key.endswith(".json"):
+                    continue
+                if manifest["processed"].get(key) == obj["ETag"]:
+                    continue
+                new_files.append({"Key": key, "ETag": obj["ETag"]})
+
+        print(f"[INFO] {len(new_files)} new files after watermark {manifest.get('watermark')}")
+        return sorted(new_files, key=lambda f: f["Key"])
+    except Exception as e:
+        print(f"[ERROR] Failed to list new S3 files: {e}")
+        return []
+
+
 def read_s3_file(bucket_name, file_key):
     try:
         response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
@@ -102,6 +256,61 @@ def read_s3_file(bucket_name, file_key):
         raise
 
 
+def fetch_and_parse(bucket_name, file_key):
+    """Download and JSON-parse one scrape file; returns (posts, stage timings, error).
+
+    On failure posts is None and error is "fetch" (worth retrying) or "parse"
+    (the file itself is malformed).
+    """
+    timings = {}
+    try:
+        start = time.perf_counter()
+        data = read_s3_file(bucket_name, file_key)
+        timings["fetch"] = time.perf_counter() - start
+    except UnicodeDecodeError:
+        return None, timings, "parse"
+    except Exception:
+        return None, timings, "fetch"
+
+    try:
+        start = time.perf_counter()
+        reddit_posts = json.loads(data)
+        timings["parse"] = time.perf_counter() - start
+        return reddit_posts, timings, None
+    except Exception as e:
+        print(f"[ERROR] Failed to parse JSON from {file_key}: {e}")
+        return None, timings, "parse"
+
+
+def prefetch_s3_files(bucket_name, file_keys, prefetch_depth=PREFETCH_DEPTH):
+    """Yield (file_key, posts, timings, error) in order while up to prefetch_depth files load in the background.
+
+    New downloads are only submitted as the consumer takes results, so at most
+    prefetch_depth parsed files are held in memory at once.
+    """
+    if prefetch_depth < 1:
+        for file_key in file_keys:
+            yield (file_key, *fetch_and_parse(bucket_name, file_key))
+        return
+
+    pending_keys = iter(file_keys)
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=prefetch_depth, thread_name_prefix="s3-prefetch") as pool:
+        for file_key in pending_keys:
+            in_flight.append((file_key, pool.submit(fetch_and_parse, bucket_name, file_key)))
+            if len(in_flight) >= prefetch_depth:
+                break
+        while in_flight:
+            file_key, future = in_flight.popleft()
+            next_key = next(pending_keys, None)
+            if next_key is not None:
+                in_flight.append((next_key, pool.submit(fetch_and_parse, bucket_name, next_key)))
+            start = time.perf_counter()
+            reddit_posts, timings, error = future.result()
+            timings["wait"] = time.perf_counter() - start
+            yield file_key, reddit_posts, timings, error
+
+
 def clean_text(text):
     text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)  # Remove markdown links
     text = re.sub(r"\s+", " ", text)
@@ -117,87 +326,779 @@ def generate_embeddings(text):
 
 
 def insert_into_pinecone(vectors):
-    batch_size = 100
+    """Upsert vectors concurrently; returns the ids that failed and were dead-lettered."""
     try:
         index = get_index()
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
+        summary = upsert_vectors(
+            index, vectors,
+            concurrency=UPSERT_CONCURRENCY,
+            max_retries=UPSERT_MAX_RETRIES,
+            dead_letter_path=UPSERT_DEAD_LETTER_PATH,
+            region_name=AWS_REGION
+        )
+    except Exception as e:
+        print(f"[ERROR] Failed during insertion into {vector_store_name()}: {e}")
+        raise
+    print(f"[INFO] Inserted {summary['upserted']} of {len(vectors)} vectors into {vector_store_name()} "
+          f"({summary['batches']} batches, {summary['retries']} retries).")
+    return set(summary["failed_ids"])
+
+
+def source_id(vector):
+    """Id of the post body or comment a vector was built from (its own id unless it is a chunk)."""
+    return vector["metadata"].get("parent_id", vector["id"])
+
+
+def stale_chunk_ids(vectors):
+    """{source id: ids to delete once these vectors are upserted}.
+
+    A text that grows past chunk_tokens moves from {id} to {id}-0..n-1, and one
+    that shrinks leaves {id}-k beyond its new chunk count, or all its chunks if
+    it fits in one window again. The stored {id} and {id}-0, whose chunk_count
+    is the earlier chunking's, show what is left over; fetch them before the
+    upsert overwrites {id}-0. {id} only needs checking for sources that are
+    chunked now, since an unchunked source overwrites it. With the embedding
+    cache, texts already upserted under the same id never get here, so only
+    sources whose text (and so chunk count) may have changed are checked.
+    """
+    counts = {source_id(v): v["metadata"].get("chunk_count", 0) for v in vectors}
+    probe = [vid for source, count in counts.items() for vid in ([source] if count else []) + [f"{source}-0"]]
+    found = {}
+    index = get_index()
+    for start in range(0, len(probe), STALE_FETCH_BATCH):
+        found.update(index.fetch(ids=probe[start:start + STALE_FETCH_BATCH])["vectors"])
+
+    stale = {}
+    for source, count in counts.items():
+        ids = set()
+        if count and source in found:
+            ids.add(source)
+        first = found.get(f"{source}-0")
+        if first is not None:
+            old_count = int((first.get("metadata") or {}).get("chunk_count", 0))
+            ids.update(f"{source}-{n}" for n in range(count, old_count))
+        if ids:
+            stale[source] = ids
+    return stale
+
+
+def delete_vectors(ids):
+    index = get_index()
+    ids = sorted(ids)
+    for start in range(0, len(ids), STALE_DELETE_BATCH):
+        index.delete(ids=ids[start:start + STALE_DELETE_BATCH])
+    print(f"[INFO] Deleted {len(ids)} stale chunk vectors")
+
+
+def build_records(reddit_posts):
+    """Flatten posts into {id, text, metadata} records ready for encoding."""
+    records = []
+    for post in reddit_posts:
+        post_id = post.get("id", "unknown-id")
+        meta = post.get("metadata", {})
+        base_meta = {
+            "subreddit": meta.get("subreddit", ""),
+            "url": meta.get("url", ""),
+            "author": meta.get("author", ""),
+            "timestamp": meta.get("timestamp", ""),
+            "embedding_model": EMBEDDING_MODEL
+        }
+
+        if post.get("body"):
+            try:
+                body_text = clean_text(post["body"])
+                records.append({
+                    "id": f"{post_id}-body",
+                    "text": body_text,
+                    "metadata": {"type": "body", **base_meta, "full_text": body_text}
+                })
+            except Exception as e:
+                print(f"[ERROR] Failed to process post body {post_id}: {e}")
+
+        for idx, comment in enumerate(post.get("comments", [])):
             try:
-                index.upsert(vectors=batch)
+                comment_text = clean_text(comment)
+                records.append({
+                    "id": f"{post_id}-comment-{idx}",
+                    "text": comment_text,
+                    "metadata": {"type": "comment", **base_meta, "full_text": comment_text}
+                })
             except Exception as e:
-                print(f"[ERROR] Pinecone upsert failed for batch starting at {i}: {e}")
+                print(f"[ERROR] Failed to process comment {idx} for post {post_id}: {e}")
+    return records
+
+
+def check_chunking(chunk_tokens, overlap):
+    if chunk_tokens > 0 and not 0 <= overlap < chunk_tokens:
+        raise ValueError(f"chunk overlap must be in [0, chunk_tokens={chunk_tokens}), got {overlap}")
+
+
+def chunk_records(records, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Split records into overlapping token windows of at most chunk_tokens tokens.
+
+    Texts that fit in one window keep their original id; longer ones become
+    {id}-{n} (e.g. {post_id}-body-0, {post_id}-body-1) with chunk metadata and
+    full_text holding only the chunk. Every record gains n_tokens. Ids left
+    over when an edited text changes chunk count are removed at upsert time
+    (see stale_chunk_ids). With chunking disabled (chunk_tokens <= 0) the
+    tokenizer is not run and n_tokens is a whitespace word count.
+    """
+    check_chunking(chunk_tokens, overlap)
+    if chunk_tokens <= 0:
+        return [{**record, "n_tokens": len(record["text"].split())} for record in records]
+    if not records:
+        return []
+    tokenizer = get_model().tokenizer
+    encodings = tokenizer(
+        [r["text"] for r in records],
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        verbose=False
+    )["offset_mapping"]
+
+    step = chunk_tokens - overlap
+    chunked = []
+    for record, offsets in zip(records, encodings):
+        if len(offsets) <= chunk_tokens:
+            chunked.append({**record, "n_tokens": len(offsets)})
+            continue
+
+        text = record["text"]
+        starts = list(range(0, len(offsets) - overlap, step))
+        for n, start in enumerate(starts):
+            window = offsets[start:start + chunk_tokens]
+            chunk_text = text[window[0][0]:window[-1][1]]
+            chunked.append({
+                "id": f"{record['id']}-{n}",
+                "text": chunk_text,
+                "n_tokens": len(window),
+                "metadata": {
+                    **record["metadata"],
+                    "full_text": chunk_text,
+                    "parent_id": record["id"],
+                    "chunk_index": n,
+                    "chunk_count": len(starts)
+                }
+            })
+    return chunked
+
+
+def encode_batched(texts, batch_size=EMBED_BATCH_SIZE):
+    """Encode texts in length-sorted batches, returning vectors in input order."""
+    if not texts:
+        return []
+    # Sorting by length keeps padding inside each batch to a minimum
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    vectors = [None] * len(texts)
+    try:
+        encoder = get_model()
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            embeddings = encoder.encode(
+                [texts[i] for i in batch_idx],
+                batch_size=batch_size,
+                show_progress_bar=False
+            )
+            for i, emb in zip(batch_idx, embeddings):
+                vectors[i] = emb.tolist()
     except Exception as e:
-        print(f"[ERROR] Failed during Pinecone insertion: {e}")
+        print(f"[ERROR] Failed to generate batched embeddings: {e}")
         raise
-    else:
-        print(f"[INFO] Inserted {len(vectors)} vectors into Pinecone.")
+    return vectors
 
 
-def process_s3_files(bucket_name, prefix, latest_only=True):
-    file_keys = retrieve_s3_files(bucket_name, prefix, latest_only=latest_only)
-    print(f"[DEBUG] Files to process: {file_keys}")
+def embed_records(records, batch_size=EMBED_BATCH_SIZE):
+    """Attach embeddings to records and return Pinecone-ready vectors."""
+    embeddings = encode_batched([r["text"] for r in records], batch_size=batch_size)
+    return [
+        {"id": r["id"], "values": emb, "metadata": r["metadata"]}
+        for r, emb in zip(records, embeddings)
+    ]
 
+
+def embed_records_cached(records, cache, batch_size=EMBED_BATCH_SIZE):
+    """Embed only texts missing from the cache; skip records already upserted under the same id.
+
+    Returns (vectors, records that went through the encoder).
+    """
+    to_encode = []
+    vectors = []
+    for r in records:
+        entry = cache.get(text_key(CACHE_MODEL_KEY, r["text"]))
+        if entry is None:
+            to_encode.append(r)
+        elif r["id"] in entry["ids"]:
+            cache.upserts_skipped += 1
+        else:
+            vectors.append({"id": r["id"], "values": entry["values"], "metadata": r["metadata"]})
+    return vectors + embed_records(to_encode, batch_size=batch_size), to_encode
+
+
+def record_processed(bucket_name, manifest, file_keys, etags, advance_watermark=True, malformed_keys=()):
+    """Record files whose vectors were upserted (no-op outside incremental mode).
+
+    Once any earlier file has failed the watermark is held back, so the next run
+    lists from before the failure; files recorded since are skipped by ETag.
+    malformed_keys could not be parsed, which a retry cannot fix: they count as
+    processed, so the watermark moves past them, and are kept under "failed".
+    """
+    if manifest is None or not (file_keys or malformed_keys):
+        return
     for file_key in file_keys:
+        mark_processed(manifest, file_key, etags[file_key], advance_watermark=advance_watermark)
+    for file_key in malformed_keys:
+        mark_processed(manifest, file_key, etags[file_key], advance_watermark=advance_watermark)
+        manifest.setdefault("failed", {})[file_key] = etags[file_key]
+    prune_manifest(manifest)
+    # Saved per group so a job killed at MaxRuntimeInSeconds resumes where it stopped
+    save_manifest(bucket_name, manifest)
+
+
+def offload_texts(vectors, doc_store):
+    """Write full_text to the document store and return vectors whose metadata omits it."""
+    texts = {v["id"]: v["metadata"]["full_text"] for v in vectors}
+    doc_store.put_many(texts)
+    slim = []
+    for v in vectors:
+        metadata = {k: val for k, val in v["metadata"].items() if k != "full_text"}
+        metadata["text_chars"] = len(texts[v["id"]])
+        slim.append({"id": v["id"], "values": v["values"], "metadata": metadata})
+    return slim
+
+
+def load_embedding_cache():
+    if not EMBED_CACHE_PATH:
+        return None
+    return EmbeddingCache(
+        EMBED_CACHE_PATH,
+        max_entries=EMBED_CACHE_MAX_ENTRIES,
+        region_name=AWS_REGION
+    ).load()
+
+
+def load_bm25_index():
+    if not BM25_INDEX_PATH:
+        return None
+    bm25 = BM25Index(BM25_INDEX_PATH, region_name=AWS_REGION).load()
+    # removals saved by the previous run are already applied to its postings; only this run's are merged
+    bm25.removed_ids.clear()
+    return bm25
+
+
+def load_signature_store():
+    if DEDUP_THRESHOLD <= 0:
+        return None
+    return SignatureStore(DEDUP_SIGNATURES_PATH, threshold=DEDUP_THRESHOLD, region_name=AWS_REGION).load()
+
+
+def print_dedup_stats(seen, dropped, encoded, encode_time):
+    """Dedup ratio, and encoder time saved estimated at this run's seconds per encoded text."""
+    saved = dropped * encode_time / encoded if encoded else 0.0
+    print(f"[INFO] Near-duplicates: {dropped}/{seen} texts dropped before encoding "
+          f"({dropped / max(seen, 1):.1%}), ~{saved:.1f}s encoder time saved")
+
+
+def print_stage_timings(stage_times, n_files, wall_time):
+    print(f"[INFO] Stage timings over {n_files} files ({wall_time:.2f}s wall):")
+    for stage in ("fetch", "parse", "wait", "build", "chunk", "dedup", "bm25", "encode", "docstore", "upsert"):
+        print(f"[INFO]   {stage:<7}{stage_times.get(stage, 0.0):9.2f}s")
+
+
+def process_s3_files(bucket_name, prefix, latest_only=True,
+                     batch_size=EMBED_BATCH_SIZE, files_per_encode=FILES_PER_ENCODE,
+                     incremental=False, prefetch_depth=PREFETCH_DEPTH,
+                     chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP,
+                     shard_index=0, shard_count=1, progress=None, cache_path=None, bm25_path=None,
+                     signatures_path=None):
+    """Embed and upsert the selected S3 files; returns a summary for merging across shards.
+
+    With shard_count > 1 only this shard's files are processed. progress, if
+    given, is called as progress(files_done, vectors_upserted) after each group.
+    cache_path, bm25_path and signatures_path redirect where the embedding
+    cache, BM25 index and dedup signatures are saved (they are still loaded
+    from EMBED_CACHE_PATH / BM25_INDEX_PATH / DEDUP_SIGNATURES_PATH).
+    """
+    check_chunking(chunk_tokens, chunk_overlap)
+    manifest = None
+    etags = {}
+    if incremental:
+        manifest = load_manifest(bucket_name)
+        new_files = retrieve_new_s3_files(bucket_name, prefix, manifest)
+        file_keys = [f["Key"] for f in new_files]
+        etags = {f["Key"]: f["ETag"] for f in new_files}
+    else:
+        file_keys = retrieve_s3_files(bucket_name, prefix, latest_only=latest_only)
+    if shard_count > 1:
+        file_keys = shard_keys(file_keys, shard_index, shard_count)
+        print(f"[INFO] Shard {shard_index + 1}/{shard_count}: {len(file_keys)} files")
+    print(f"[DEBUG] Files to process: {file_keys}")
+    cache = load_embedding_cache()
+    if cache is not None and cache_path:
+        cache.path = cache_path
+    bm25 = load_bm25_index()
+    if bm25 is not None and bm25_path:
+        bm25.path = bm25_path
+    signatures = load_signature_store()
+    if signatures is not None and signatures_path:
+        signatures.path = signatures_path
+    doc_store = open_doc_store(DOC_STORE_URI, region_name=AWS_REGION) if DOC_STORE_URI else None
+
+    # fetch/parse run on the prefetch pool; "wait" is how long the encoder sat idle on S3
+    stage_times = defaultdict(float)
+    chunk_stats = defaultdict(int)
+    dedup_stats = defaultdict(int)
+    upserted = 0
+    hold_watermark = False
+    run_start = time.perf_counter()
+    files = prefetch_s3_files(bucket_name, file_keys, prefetch_depth=prefetch_depth)
+
+    # Records from several files are encoded together so batches stay full
+    for group_start in range(0, len(file_keys), files_per_encode):
+        if progress is not None:
+            progress(group_start, upserted)
+        group_keys = file_keys[group_start:group_start + files_per_encode]
+        records = []
+        loaded_keys = []
+        malformed_keys = []
+        for _ in group_keys:
+            file_key, reddit_posts, timings, error = next(files)
+            for stage, seconds in timings.items():
+                stage_times[stage] += seconds
+            if error == "parse":
+                malformed_keys.append(file_key)
+                continue
+            if reddit_posts is None:
+                continue
+            start = time.perf_counter()
+            file_records = build_records(reddit_posts)
+            stage_times["build"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            file_records = chunk_records(file_records, chunk_tokens=chunk_tokens, overlap=chunk_overlap)
+            stage_times["chunk"] += time.perf_counter() - start
+            chunk_stats["chunks"] += len(file_records)
+            chunk_stats["tokens"] += sum(r["n_tokens"] for r in file_records)
+
+            records.extend(file_records)
+            loaded_keys.append(file_key)
+        if malformed_keys:
+            print(f"[WARN] Skipping malformed files {malformed_keys}; recorded as failed in the manifest")
+        if len(loaded_keys) + len(malformed_keys) < len(group_keys):
+            # A fetch failure is usually transient, so the next run retries from before it
+            hold_watermark = True
+
+        kept_signatures = {}
+        if signatures is not None and records:
+            start = time.perf_counter()
+            records, dropped, kept_signatures = signatures.deduplicate(records)
+            stage_times["dedup"] += time.perf_counter() - start
+            dedup_stats["seen"] += len(records) + len(dropped)
+            dedup_stats["dropped"] += len(dropped)
+
+        if bm25 is not None and records:
+            start = time.perf_counter()
+            bm25.add({r["id"]: r["text"] for r in records})
+            stage_times["bm25"] += time.perf_counter() - start
+
+        if not records:
+            record_processed(bucket_name, manifest, loaded_keys, etags, not hold_watermark, malformed_keys)
+            continue
+
         try:
-            data = read_s3_file(bucket_name, file_key)
-            reddit_posts = json.loads(data)
+            start = time.perf_counter()
+            if cache is not None:
+                vectors, encoded = embed_records_cached(records, cache, batch_size=batch_size)
+            else:
+                vectors, encoded = embed_records(records, batch_size=batch_size), records
+            elapsed = time.perf_counter() - start
+            stage_times["encode"] += elapsed
+            # Throughput counts only what reached the encoder, not dedup drops or cache hits
+            dedup_stats["encoded"] += len(encoded)
+            chunk_stats["encoded_tokens"] += sum(r["n_tokens"] for r in encoded)
+            print(f"[INFO] Prepared {len(vectors)} vectors in {elapsed:.2f}s "
+                  f"({len(vectors) / max(elapsed, 1e-9):.1f} texts/s, batch_size={batch_size})")
         except Exception as e:
-            print(f"[ERROR] Failed to load or parse JSON from {file_key}: {e}")
+            print(f"[ERROR] Failed to embed records for files {group_keys}: {e}")
+            hold_watermark = True
             continue
 
-        vectors = []
-        for post in reddit_posts:
-            post_id = post.get("id", "unknown-id")
-            meta = post.get("metadata", {})
-            subreddit = meta.get("subreddit", "")
-            url = meta.get("url", "")
-            author = meta.get("author", "")
-            timestamp = meta.get("timestamp", "")
+        if not vectors:
+            print(f"[INFO] All texts in {group_keys} unchanged, skipping upsert")
+            if signatures is not None:
+                signatures.add(kept_signatures)
+            record_processed(bucket_name, manifest, loaded_keys, etags, not hold_watermark, malformed_keys)
+            continue
+
+        texts = {v["id"]: v["metadata"]["full_text"] for v in vectors}
+        if doc_store is not None:
+            # Texts are stored before their vectors so a query never sees a vector without text
+            try:
+                start = time.perf_counter()
+                inline_bytes = sum(vector_size_bytes(v) for v in vectors)
+                vectors = offload_texts(vectors, doc_store)
+                offloaded_bytes = sum(vector_size_bytes(v) for v in vectors)
+                stage_times["docstore"] += time.perf_counter() - start
+                print(f"[INFO] Upsert payload {inline_bytes / 1024:.0f} KB -> {offloaded_bytes / 1024:.0f} KB "
+                      f"with text in the document store ({offloaded_bytes / max(inline_bytes, 1):.0%})")
+            except Exception as e:
+                print(f"[ERROR] Failed to write texts to document store for files {group_keys}: {e}")
+                hold_watermark = True
+                continue
+
+        try:
+            start = time.perf_counter()
+            stale = stale_chunk_ids(vectors)
+            failed_ids = insert_into_pinecone(vectors)
+            upserted += len(vectors) - len(failed_ids)
+            # A source with a dead-lettered chunk keeps its old chunks until the retry lands
+            failed_sources = {source_id(v) for v in vectors if v["id"] in failed_ids}
+            stale_ids = {vid for source, ids in stale.items() if source not in failed_sources for vid in ids}
+            if stale_ids:
+                delete_vectors(stale_ids)
+            stage_times["upsert"] += time.perf_counter() - start
+        except Exception as e:
+            print(f"[ERROR] Failed to insert vectors into {vector_store_name()} for files {group_keys}: {e}")
+            hold_watermark = True
+            continue
+
+        if cache is not None:
+            for v in vectors:
+                if v["id"] not in failed_ids:
+                    cache.put(text_key(CACHE_MODEL_KEY, texts[v["id"]]), v["values"], v["id"])
+        if signatures is not None:
+            signatures.add({vid: sig for vid, sig in kept_signatures.items() if vid not in failed_ids})
+            signatures.discard(stale_ids)
+        if cache is not None and stale_ids:
+            cache.forget_ids(stale_ids)
+        if bm25 is not None and stale_ids:
+            bm25.remove(stale_ids)
+        if doc_store is not None and stale_ids:
+            try:
+                doc_store.delete_many(stale_ids)
+            except Exception as e:
+                # The vectors are already gone, so an orphaned text is never fetched again
+                print(f"[WARN] Failed to delete {len(stale_ids)} stale texts from document store: {e}")
+        if failed_ids:
+            # Leave these files after the watermark so the next run retries the dead-lettered vectors
+            print(f"[WARN] {len(failed_ids)} vectors dead-lettered; not marking {loaded_keys} as processed")
+            hold_watermark = True
+            continue
+        record_processed(bucket_name, manifest, loaded_keys, etags, not hold_watermark, malformed_keys)
+
+    files.close()
+    flush_index()
+    if bm25 is not None:
+        start = time.perf_counter()
+        bm25.save()
+        stage_times["bm25"] += time.perf_counter() - start
+    if signatures is not None:
+        start = time.perf_counter()
+        signatures.save()
+        stage_times["dedup"] += time.perf_counter() - start
+    if progress is not None:
+        progress(len(file_keys), upserted)
+    wall_time = time.perf_counter() - run_start
+    print_stage_timings(stage_times, len(file_keys), wall_time)
+    if chunk_stats["chunks"]:
+        encode_time = stage_times.get("encode", 0.0)
+        print(f"[INFO] {chunk_stats['chunks']} chunks, avg {chunk_stats['tokens'] / chunk_stats['chunks']:.1f} "
+              f"tokens/chunk; {chunk_stats['encoded_tokens']} tokens encoded at "
+              f"{chunk_stats['encoded_tokens'] / max(encode_time, 1e-9):.0f} tokens/s")
+    if signatures is not None:
+        print_dedup_stats(dedup_stats["seen"], dedup_stats["dropped"], dedup_stats["encoded"],
+                          stage_times.get("encode", 0.0))
+
+    if cache is not None:
+        cache.save()
+        stats = cache.stats()
+        print(f"[INFO] Embedding cache: {stats['hits']} hits / {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%}), {stats['upserts_skipped']} upserts skipped, "
+              f"{stats['entries']} entries")
+
+    return {
+        "files": len(file_keys),
+        "vectors": upserted,
+        "wall_time": wall_time,
+        "stage_times": dict(stage_times),
+        "chunks": chunk_stats["chunks"],
+        "tokens": chunk_stats["tokens"],
+        "encoded_tokens": chunk_stats["encoded_tokens"],
+        "dedup": dict(dedup_stats),
+        "complete": not hold_watermark,
+    }
+
+
+# ---------------------- BACKFILL ----------------------
+
+def shard_keys(file_keys, shard_index, shard_count):
+    """Deterministic shard of file_keys: a key always lands on the same shard, however it was listed."""
+    return [k for k in file_keys if zlib.crc32(k.encode("utf-8")) % shard_count == shard_index]
 
-            if post.get("body"):
-                try:
-                    body_text = clean_text(post["body"])
-                    body_vec = generate_embeddings(body_text)
-                    vectors.append({
-                        "id": f"{post_id}-body",
-                        "values": body_vec,
-                        "metadata": {
-                            "type": "body",
-                            "subreddit": subreddit,
-                            "url": url,
-                            "author": author,
-                            "timestamp": timestamp,
-                            "full_text": body_text,
-                            "embedding_model": EMBEDDING_MODEL
-                        }
-                    })
-                except Exception as e:
-                    print(f"[ERROR] Failed to process post body {post_id}: {e}")
 
-            for idx, comment in enumerate(post.get("comments", [])):
+def host_shard():
+    """(host index, host count) of this SageMaker processing instance; (0, 1) outside SageMaker."""
+    try:
+        with open(SAGEMAKER_RESOURCE_CONFIG, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return 0, 1
+    hosts = sorted(config["hosts"])
+    return hosts.index(config["current_host"]), len(hosts)
+
+
+def _backfill_worker(bucket_name, prefix, shard_index, shard_count, progress_queue, state_paths, kwargs):
+    def progress(files_done, vectors):
+        progress_queue.put((shard_index, files_done, vectors))
+
+    return process_s3_files(bucket_name, prefix, latest_only=False, shard_index=shard_index,
+                            shard_count=shard_count, progress=progress, **state_paths, **kwargs)
+
+
+def _report_progress(progress_queue, total_files, workers):
+    """Merge per-shard progress messages into one line; stops on a None sentinel."""
+    done = {}
+    start = time.perf_counter()
+    last_print = 0.0
+    while True:
+        message = progress_queue.get()
+        if message is None:
+            return
+        shard, files_done, vectors = message
+        done[shard] = (files_done, vectors)
+        now = time.perf_counter()
+        if now - last_print < BACKFILL_PROGRESS_INTERVAL:
+            continue
+        last_print = now
+        files = sum(f for f, _ in done.values())
+        vectors = sum(v for _, v in done.values())
+        elapsed = now - start
+        rate = files / max(elapsed, 1e-9)
+        eta = f"{(total_files - files) / rate:.0f}s" if rate else "?"
+        print(f"[PROGRESS] {files}/{total_files} files, {vectors} vectors from {len(done)}/{workers} workers "
+              f"({rate * 60:.1f} files/min, {vectors / max(elapsed, 1e-9):.1f} vectors/s, ETA {eta})")
+
+
+def backfill(bucket_name, prefix, workers=EMBED_WORKERS, **kwargs):
+    """Re-embed the full S3 history across a process pool, one model per worker.
+
+    Files are sharded by key hash across workers x SageMaker instances, so each
+    instance of a multi-instance processing job takes a disjoint slice. Per-shard
+    caches, BM25 postings and dedup signatures are merged once every worker is
+    done; other instances leave theirs under a .host-N suffix, which the first
+    instance waits for and folds into the configured paths. Shard and host files
+    are deleted once the state they hold has been merged and saved.
+    """
+    if VECTOR_STORE == "local" and workers > 1:
+        raise ValueError("VECTOR_STORE=local supports a single writer; run the backfill with workers=1")
+    check_chunking(kwargs.get("chunk_tokens", CHUNK_TOKENS), kwargs.get("chunk_overlap", CHUNK_OVERLAP))
+
+    host_index, host_count = host_shard()
+    if host_count > 1:
+        local_paths = [path for path in backfill_state_paths() if not path.startswith("s3://")]
+        if local_paths:
+            raise ValueError(f"Instances of a multi-instance backfill only share s3:// state; "
+                             f"{local_paths} would never be merged")
+        if host_index == 0:
+            # Markers left by an earlier, interrupted run must not pass for this run's
+            clear_host_markers(host_count)
+    shard_count = workers * host_count
+    # Global shard ids: this host owns a contiguous block, so hosts x workers cover every key once
+    shard_ids = [host_index * workers + w for w in range(workers)]
+    all_keys = retrieve_s3_files(bucket_name, prefix, latest_only=False)
+    total_files = sum(len(shard_keys(all_keys, i, shard_count)) for i in shard_ids)
+    print(f"[INFO] Backfill: {total_files} files on host {host_index + 1}/{host_count}, "
+          f"{workers} workers ({shard_count} shards total)")
+
+    cache_paths = {i: f"{EMBED_CACHE_PATH}.shard-{i}" if EMBED_CACHE_PATH else None for i in shard_ids}
+    bm25_paths = {i: f"{BM25_INDEX_PATH}.shard-{i}" if BM25_INDEX_PATH else None for i in shard_ids}
+    signature_paths = {i: f"{DEDUP_SIGNATURES_PATH}.shard-{i}" if DEDUP_SIGNATURES_PATH else None
+                       for i in shard_ids}
+    run_start = time.perf_counter()
+    # spawn, not fork: each worker loads its own model instead of inheriting torch thread state
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        progress_queue = manager.Queue()
+        reporter = threading.Thread(target=_report_progress, args=(progress_queue, total_files, workers),
+                                    daemon=True)
+        reporter.start()
+        summaries = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = {
+                pool.submit(_backfill_worker, bucket_name, prefix, i, shard_count, progress_queue,
+                            {"cache_path": cache_paths[i], "bm25_path": bm25_paths[i],
+                             "signatures_path": signature_paths[i]}, kwargs): i
+                for i in shard_ids
+            }
+            for future in as_completed(futures):
                 try:
-                    comment_text = clean_text(comment)
-                    comment_vec = generate_embeddings(comment_text)
-                    vectors.append({
-                        "id": f"{post_id}-comment-{idx}",
-                        "values": comment_vec,
-                        "metadata": {
-                            "type": "comment",
-                            "subreddit": subreddit,
-                            "url": url,
-                            "author": author,
-                            "timestamp": timestamp,
-                            "full_text": comment_text,
-                            "embedding_model": EMBEDDING_MODEL
-                        }
-                    })
+                    summaries.append(future.result())
                 except Exception as e:
-                    print(f"[ERROR] Failed to process comment {idx} for post {post_id}: {e}")
+                    print(f"[ERROR] Backfill shard {futures[future]} failed: {e}")
+        progress_queue.put(None)
+        reporter.join()
 
-        try:
-            insert_into_pinecone(vectors)
-        except Exception as e:
-            print(f"[ERROR] Failed to insert vectors into Pinecone for file {file_key}: {e}")
+    wall_time = time.perf_counter() - run_start
+    stage_times = defaultdict(float)
+    for summary in summaries:
+        for stage, seconds in summary["stage_times"].items():
+            stage_times[stage] += seconds
+    files = sum(s["files"] for s in summaries)
+    vectors = sum(s["vectors"] for s in summaries)
+    encode_time = stage_times.get("encode", 0.0)
+    # Summed stage time over wall time is the effective parallelism (ideal: workers)
+    print_stage_timings(stage_times, files, wall_time)
+    if DEDUP_THRESHOLD > 0:
+        dedup = defaultdict(int)
+        for summary in summaries:
+            for name, count in summary["dedup"].items():
+                dedup[name] += count
+        print_dedup_stats(dedup["seen"], dedup["dropped"], dedup["encoded"], encode_time)
+    print(f"[INFO] Backfill done: {files} files, {vectors} vectors in {wall_time:.1f}s "
+          f"({vectors / max(wall_time, 1e-9):.1f} vectors/s); {len(summaries)}/{len(shard_ids)} shards ok, "
+          f"encode parallelism x{encode_time / max(wall_time, 1e-9):.2f} of {workers}")
+    if any(not s["complete"] for s in summaries) or len(summaries) < len(shard_ids):
+        print("[WARN] Some files failed; rerun the backfill (cached texts are not re-encoded)")
+
+    # Concurrent instances would overwrite each other's merge, so all but the first keep a host suffix
+    suffix = "" if host_index == 0 else f".host-{host_index}"
+    saved = True
+    if EMBED_CACHE_PATH:
+        saved &= merge_shard_caches([cache_paths[i] for i in shard_ids], EMBED_CACHE_PATH + suffix)
+    if BM25_INDEX_PATH:
+        saved &= merge_shard_bm25([bm25_paths[i] for i in shard_ids], BM25_INDEX_PATH + suffix)
+    if DEDUP_SIGNATURES_PATH and DEDUP_THRESHOLD > 0:
+        saved &= merge_shard_signatures([signature_paths[i] for i in shard_ids], DEDUP_SIGNATURES_PATH + suffix)
+    if not saved:
+        print("[ERROR] Could not save the merged backfill state; keeping the shard files")
+        return
+    delete_paths([path for paths in (cache_paths, bm25_paths, signature_paths)
+                  for path in paths.values() if path])
+    if host_count > 1:
+        if host_index > 0:
+            for path in backfill_state_paths():
+                put_s3_path(f"{path}.host-{host_index}.done", b"")
+        else:
+            merge_host_states(host_count)
+
+
+def backfill_state_paths():
+    """State files a backfill writes per shard and merges afterwards"""
+    paths = [path for path in (EMBED_CACHE_PATH, BM25_INDEX_PATH) if path]
+    if DEDUP_SIGNATURES_PATH and DEDUP_THRESHOLD > 0:
+        paths.append(DEDUP_SIGNATURES_PATH)
+    return paths
+
+
+def _split_s3_path(path):
+    bucket, _, key = path[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def put_s3_path(path, body):
+    bucket, key = _split_s3_path(path)
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body)
+
+
+def s3_path_exists(path):
+    bucket, key = _split_s3_path(path)
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except s3_client.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def delete_paths(paths):
+    """Remove local or s3:// files; ones that are already gone are ignored."""
+    for path in paths:
+        if path.startswith("s3://"):
+            bucket, key = _split_s3_path(path)
+            s3_client.delete_object(Bucket=bucket, Key=key)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def clear_host_markers(host_count):
+    for path in backfill_state_paths():
+        for host in range(1, host_count):
+            bucket, key = _split_s3_path(f"{path}.host-{host}.done")
+            s3_client.delete_object(Bucket=bucket, Key=key)
+
+
+def merge_host_states(host_count):
+    """On the first instance: wait for every other instance's .host-N state, then fold it in.
+
+    Each instance drops a .done marker next to its state files once they are
+    saved. Instances still missing after BACKFILL_MERGE_TIMEOUT are left out of
+    the merge; rerun the backfill to pick up their texts. Merged .host-N files
+    and their markers are deleted once the merged state is saved.
+    """
+    paths = backfill_state_paths()
+    if not paths:
+        return
+    pending = set(range(1, host_count))
+    deadline = time.monotonic() + BACKFILL_MERGE_TIMEOUT
+    while True:
+        pending = {host for host in pending
+                   if not all(s3_path_exists(f"{path}.host-{host}.done") for path in paths)}
+        if not pending:
+            break
+        if time.monotonic() > deadline:
+            print(f"[ERROR] Timed out waiting for backfill state from hosts {sorted(pending)}; "
+                  f"merging the others only")
+            break
+        print(f"[INFO] Waiting for backfill state from hosts {sorted(pending)}...")
+        time.sleep(BACKFILL_MERGE_POLL)
+
+    hosts = [host for host in range(1, host_count) if host not in pending]
+    saved = True
+    if EMBED_CACHE_PATH:
+        saved &= merge_shard_caches([f"{EMBED_CACHE_PATH}.host-{host}" for host in hosts], EMBED_CACHE_PATH)
+    if BM25_INDEX_PATH:
+        saved &= merge_shard_bm25([f"{BM25_INDEX_PATH}.host-{host}" for host in hosts], BM25_INDEX_PATH)
+    if DEDUP_SIGNATURES_PATH and DEDUP_THRESHOLD > 0:
+        saved &= merge_shard_signatures([f"{DEDUP_SIGNATURES_PATH}.host-{host}" for host in hosts],
+                                        DEDUP_SIGNATURES_PATH)
+    if not saved:
+        print("[ERROR] Could not save the merged backfill state; keeping the .host-N files")
+        return
+    delete_paths([f"{path}.host-{host}{marker}" for path in paths for host in hosts for marker in ("", ".done")])
+    print(f"[INFO] Merged backfill state from {len(hosts) + 1}/{host_count} hosts into {', '.join(paths)}")
+
+
+def merge_shard_caches(shard_paths, target):
+    """Fold per-shard (or per-host) cache files into the cache at EMBED_CACHE_PATH and save it to target."""
+    merged = load_embedding_cache()
+    merged.path = target
+    for path in shard_paths:
+        shard = EmbeddingCache(path, max_entries=EMBED_CACHE_MAX_ENTRIES, region_name=AWS_REGION).load()
+        merged.merge(shard)
+    return merged.save()
+
+
+def merge_shard_bm25(shard_paths, target):
+    """Fold per-shard (or per-host) BM25 postings into BM25_INDEX_PATH's and save them to target."""
+    merged = load_bm25_index()
+    merged.path = target
+    for path in shard_paths:
+        merged.merge(BM25Index(path, region_name=AWS_REGION).load())
+    return merged.save()
+
+
+def merge_shard_signatures(shard_paths, target):
+    """Fold per-shard (or per-host) dedup signatures into DEDUP_SIGNATURES_PATH's and save them to target.
+
+    Shards only deduplicate within themselves, so copies split across shards
+    are all kept in this run; later runs check against the merged store.
+    """
+    merged = load_signature_store()
+    merged.path = target
+    for path in shard_paths:
+        shard = SignatureStore(path, threshold=DEDUP_THRESHOLD, region_name=AWS_REGION).load()
+        merged.merge(shard)
+    return merged.save()
 
 
 # ---------------------- MAIN ENTRY ----------------------
@@ -207,9 +1108,45 @@ import logging
 import gc
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed scraped Reddit posts into Pinecone or a local vector store")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="Number of texts per encoder forward pass")
+    parser.add_argument("--files-per-encode", type=int, default=FILES_PER_ENCODE,
+                        help="Number of S3 files whose texts are encoded together")
+    parser.add_argument("--mode", choices=["latest", "all", "incremental"], default=INGEST_MODE,
+                        help="latest: newest file only; all: full history; "
+                             "incremental: every file not yet in the manifest")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS,
+                        help="Max tokens per chunk (0 disables chunking)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP,
+                        help="Tokens shared between consecutive chunks")
+    parser.add_argument("--prefetch-depth", type=int, default=PREFETCH_DEPTH,
+                        help="S3 files downloaded and parsed ahead of the encoder (0 disables)")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS,
+                        help="Worker processes for --mode all, each with its own model")
+    args = parser.parse_args()
+
     print("[INFO] Starting embedding generation...")
     try:
-        process_s3_files(S3_BUCKET_NAME, S3_PREFIX)
+        options = dict(
+            batch_size=args.batch_size,
+            files_per_encode=args.files_per_encode,
+            prefetch_depth=args.prefetch_depth,
+            chunk_tokens=args.chunk_tokens,
+            chunk_overlap=args.chunk_overlap
+        )
+        if args.mode == "all" and (args.workers > 1 or host_shard()[1] > 1):
+            backfill(S3_BUCKET_NAME, S3_PREFIX, workers=args.workers, **options)
+        elif host_shard()[0] > 0:
+            # Extra instances only make sense for a backfill; the rest would race on the manifest
+            print(f"[INFO] --mode {args.mode} runs on the first instance only; nothing to do here")
+        else:
+            process_s3_files(
+                S3_BUCKET_NAME, S3_PREFIX,
+                latest_only=args.mode == "latest",
+                incremental=args.mode == "incremental",
+                **options
+            )
         print("[INFO] ✅ All done.")
     except Exception as e:
         print(f"[FATAL] Uncaught exception during embedding generation: {e}")
@@ -0,0 +1,245 @@
+import io
+import re
+import zlib
+
+import boto3
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingle_hashes(text, size=5):
+    """crc32 of every word 5-gram (the whole text when shorter) as uint64."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def same_source(record, other_id):
+    """other_id is the record's own id, or a chunk id {source}-{n} of the same post or comment."""
+    source = record.get("metadata", {}).get("parent_id", record["id"])
+    if other_id in (record["id"], source):
+        return True
+    return other_id.startswith(f"{source}-") and other_id[len(source) + 1:].isdigit()
+
+
+class SignatureStore:
+    """MinHash signatures of every stored text, with LSH band lookups.
+
+    Persisted as ids + a uint32 [n, num_perm] signature matrix (local .npz or
+    s3://; an empty path keeps it in memory for the run). Band keys are derived
+    on load and kept sorted per band, so a batch of lookups is one searchsorted
+    per band. A candidate counts as a duplicate when the share of equal MinHash
+    values (the Jaccard estimate over word 5-shingles) is at least threshold.
+    Signatures are only added after their vectors are upserted, so a failed
+    upsert is retried rather than deduplicated away.
+    """
+
+    def __init__(self, path, threshold=0.9, num_perm=64, bands=16, seed=1, region_name="us-east-1"):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.region_name = region_name
+        rng = np.random.default_rng(seed)
+        # a < 2**32 keeps a * hash (< 2**32) inside uint64
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self.band_mult = rng.integers(1, 1 << 63, size=num_perm // bands, dtype=np.uint64)
+        self.ids = []
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self.sorted_keys = np.zeros((bands, 0), dtype=np.uint64)
+        self.order = np.zeros((bands, 0), dtype=np.int64)
+        self.pending_ids = []
+        self.pending_signatures = []
+        self.pending_buckets = {}
+        self.discarded = set()
+
+    # ---------------------- hashing ----------------------
+
+    def signature(self, text):
+        hashes = shingle_hashes(text)
+        permuted = (np.outer(hashes, self.a) % MERSENNE_PRIME + self.b) % MERSENNE_PRIME
+        return (permuted & MAX_HASH).min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signatures):
+        """[m, bands] uint64 key per band; multiply-add wraps mod 2**64 by design."""
+        rows = signatures.reshape(len(signatures), self.bands, -1).astype(np.uint64)
+        with np.errstate(over="ignore"):
+            return (rows * self.band_mult).sum(axis=2, dtype=np.uint64)
+
+    # ---------------------- lookups ----------------------
+
+    def _similar(self, sig, other):
+        return float(np.mean(sig == other))
+
+    def deduplicate(self, records):
+        """Split records into (kept, dropped, signatures).
+
+        dropped is a list of (record, canonical_id, similarity) for records that
+        near-duplicate a stored text or an earlier record in the same batch;
+        signatures maps kept ids to their signature for add() once upserted.
+        A record never duplicates an earlier text from its own source, i.e. its
+        own id or another chunking of the same post or comment: a re-scraped
+        (possibly edited) text goes on to the embedding cache and upsert, which
+        skip it when unchanged and replace the stored text otherwise.
+        """
+        if not records:
+            return [], [], {}
+        sigs = np.stack([self.signature(r["text"]) for r in records])
+        keys = self.band_keys(sigs)
+
+        # Candidate rows in the persisted store, one vectorized searchsorted per band
+        stored = [set() for _ in records]
+        for band in range(self.bands):
+            lo = np.searchsorted(self.sorted_keys[band], keys[:, band], side="left")
+            hi = np.searchsorted(self.sorted_keys[band], keys[:, band], side="right")
+            for i in np.flatnonzero(hi > lo):
+                stored[i].update(self.order[band, lo[i]:hi[i]].tolist())
+
+        kept, dropped, kept_sigs = [], [], {}
+        batch_buckets = {}
+        for i, record in enumerate(records):
+            match = None
+            for row in stored[i]:
+                if self.ids[row] in self.discarded or same_source(record, self.ids[row]):
+                    continue
+                sim = self._similar(sigs[i], self.signatures[row])
+                if sim >= self.threshold:
+                    match = (self.ids[row], sim)
+                    break
+            if match is None:
+                for band in range(self.bands):
+                    key = (band, int(keys[i, band]))
+                    for source, j in self.pending_buckets.get(key, []) + batch_buckets.get(key, []):
+                        other_id = self.pending_ids[j] if source == "pending" else records[j]["id"]
+                        if (source == "pending" and other_id in self.discarded) or same_source(record, other_id):
+                            continue
+                        other = self.pending_signatures[j] if source == "pending" else sigs[j]
+                        sim = self._similar(sigs[i], other)
+                        if sim >= self.threshold:
+                            match = (other_id, sim)
+                            break
+                    if match is not None:
+                        break
+            if match is not None:
+                dropped.append((record, match[0], match[1]))
+                continue
+            kept.append(record)
+            kept_sigs[record["id"]] = sigs[i]
+            for band in range(self.bands):
+                batch_buckets.setdefault((band, int(keys[i, band])), []).append(("batch", i))
+        return kept, dropped, kept_sigs
+
+    def add(self, signatures):
+        """Record {id: signature} for texts that are now in the index."""
+        if not signatures:
+            return
+        ids = list(signatures)
+        self.discarded.difference_update(ids)
+        sigs = np.stack([signatures[vid] for vid in ids])
+        keys = self.band_keys(sigs)
+        for vid, sig, row_keys in zip(ids, sigs, keys):
+            j = len(self.pending_ids)
+            self.pending_ids.append(vid)
+            self.pending_signatures.append(sig)
+            for band in range(self.bands):
+                self.pending_buckets.setdefault((band, int(row_keys[band])), []).append(("pending", j))
+
+    def discard(self, ids):
+        """Forget texts deleted from the index (e.g. stale chunks); dropped for good on save()."""
+        self.discarded.update(ids)
+
+    def merge(self, other):
+        """Add another store's signatures (e.g. a backfill shard) without cross-checking them."""
+        self.add(dict(zip(other.ids + other.pending_ids,
+                          list(other.signatures) + other.pending_signatures)))
+
+    def __len__(self):
+        return len(self.ids) + len(self.pending_ids)
+
+    # ---------------------- persistence ----------------------
+
+    def _index(self):
+        keys = self.band_keys(self.signatures)
+        self.order = np.argsort(keys, axis=0, kind="stable").T.copy()
+        self.sorted_keys = np.take_along_axis(keys, self.order.T, axis=0).T.copy()
+
+    def _is_s3(self):
+        return self.path.startswith("s3://")
+
+    def _s3_location(self):
+        bucket, _, key = self.path[len("s3://"):].partition("/")
+        return bucket, key
+
+    def load(self):
+        if not self.path:
+            return self
+        try:
+            if self._is_s3():
+                bucket, key = self._s3_location()
+                s3 = boto3.client("s3", region_name=self.region_name)
+                try:
+                    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+                except s3.exceptions.NoSuchKey:
+                    print(f"[INFO] No signature store at {self.path}, starting empty")
+                    return self
+                blob = np.load(io.BytesIO(body))
+            else:
+                blob = np.load(self.path)
+        except FileNotFoundError:
+            print(f"[INFO] No signature store at {self.path}, starting empty")
+            return self
+
+        if blob["signatures"].shape[1] != self.num_perm:
+            print(f"[WARN] Signature store {self.path} uses {blob['signatures'].shape[1]} permutations, "
+                  f"expected {self.num_perm}; starting empty")
+            return self
+        self.ids = blob["ids"].tolist()
+        self.signatures = blob["signatures"]
+        self._index()
+        print(f"[INFO] Loaded {len(self.ids)} MinHash signatures from {self.path}")
+        return self
+
+    def save(self):
+        """Fold in pending and discarded ids and write the store; False if the write failed."""
+        if self.pending_ids:
+            self.ids = self.ids + self.pending_ids
+            self.signatures = np.vstack([self.signatures, np.stack(self.pending_signatures)])
+            self.pending_ids, self.pending_signatures, self.pending_buckets = [], [], {}
+            if len(set(self.ids)) != len(self.ids):
+                # A re-upserted id keeps only its latest text's signature
+                rows = sorted({vid: row for row, vid in enumerate(self.ids)}.values())
+                self.ids = [self.ids[row] for row in rows]
+                self.signatures = self.signatures[rows]
+            self._index()
+        if self.discarded:
+            rows = [row for row, vid in enumerate(self.ids) if vid not in self.discarded]
+            self.ids = [self.ids[row] for row in rows]
+            self.signatures = self.signatures[rows]
+            self.discarded = set()
+            self._index()
+        if not self.ids or not self.path:
+            return True
+        buffer = io.BytesIO()
+        np.savez(buffer, ids=np.array(self.ids, dtype=str), signatures=self.signatures)
+        try:
+            if self._is_s3():
+                bucket, key = self._s3_location()
+                s3 = boto3.client("s3", region_name=self.region_name)
+                s3.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
+            else:
+                with open(self.path, "wb") as f:
+                    f.write(buffer.getvalue())
+            print(f"[INFO] Saved {len(self.ids)} MinHash signatures to {self.path}")
+        except Exception as e:
+            print(f"[ERROR] Failed to save signature store {self.path}: {e}")
+            return False
+        return True
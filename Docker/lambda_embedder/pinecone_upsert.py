@@ -0,0 +1,115 @@
+import io
+import json
+import time
+import random
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import boto3
+
+# Pinecone rejects upsert requests over 2 MB or 1000 vectors; stay under both
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+# Upper bound on a float32 rendered as JSON, e.g. "-0.012345678901234567,"
+BYTES_PER_VALUE = 24
+
+
+def vector_size_bytes(vector):
+    """Approximate serialized size of one vector in an upsert request.
+
+    Values are estimated rather than serialized since every vector has the same
+    dimension; only id and metadata vary enough to be worth measuring.
+    """
+    metadata = json.dumps(vector.get("metadata", {}), separators=(",", ":"))
+    return len(vector["id"]) + len(vector["values"]) * BYTES_PER_VALUE + len(metadata.encode("utf-8")) + 32
+
+
+def batch_by_bytes(vectors, max_bytes=int(MAX_REQUEST_BYTES * 0.9), max_vectors=1000):
+    """Split vectors into batches bounded by payload bytes rather than a fixed count.
+
+    full_text metadata makes vector sizes vary by an order of magnitude, so a
+    fixed count either wastes requests or overflows the request limit.
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        size = vector_size_bytes(vector)
+        if batch and (batch_bytes + size > max_bytes or len(batch) >= max_vectors):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def upsert_with_retry(index, batch, max_retries=5, base_delay=0.5, max_delay=20.0):
+    """Upsert one batch, retrying with full-jitter exponential backoff. Raises the last error."""
+    for attempt in range(max_retries + 1):
+        try:
+            index.upsert(vectors=batch)
+            return attempt
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            print(f"[WARN] Upsert of {len(batch)} vectors failed (attempt {attempt + 1}): {e}; "
+                  f"retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def write_dead_letter(path, batch, error, region_name="us-east-1"):
+    """Persist a batch that exhausted its retries so it can be replayed later.
+
+    path is a local JSONL file, or an s3://bucket/prefix/ under which one
+    object is written per failed batch.
+    """
+    record = {
+        "failed_at": datetime.now(timezone.utc).isoformat(),
+        "error": str(error),
+        "vectors": batch,
+    }
+    try:
+        if path.startswith("s3://"):
+            bucket, _, prefix = path[len("s3://"):].partition("/")
+            key = f"{prefix.rstrip('/')}/{datetime.now(timezone.utc):%Y%m%d_%H%M%S_%f}_{batch[0]['id']}.json"
+            boto3.client("s3", region_name=region_name).put_object(
+                Bucket=bucket, Key=key, Body=json.dumps(record), ContentType="application/json"
+            )
+        else:
+            with io.open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        print(f"[ERROR] Wrote {len(batch)} vectors to dead-letter {path}")
+    except Exception as e:
+        print(f"[FATAL] Could not write dead-letter batch starting at {batch[0]['id']}: {e}")
+
+
+def upsert_vectors(index, vectors, concurrency=4, max_bytes=int(MAX_REQUEST_BYTES * 0.9),
+                   max_vectors=1000, max_retries=5, base_delay=0.5, dead_letter_path=None,
+                   region_name="us-east-1"):
+    """Upsert vectors in byte-sized batches across a thread pool.
+
+    index only needs an upsert(vectors=...) method, so a local fake can stand in
+    for Pinecone. Returns a summary with the ids of vectors that were dead-lettered.
+    """
+    batches = batch_by_bytes(vectors, max_bytes=max_bytes, max_vectors=max_vectors)
+    summary = {"batches": len(batches), "upserted": 0, "retries": 0, "failed_ids": []}
+    if not batches:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="upsert") as pool:
+        futures = {
+            pool.submit(upsert_with_retry, index, batch, max_retries, base_delay): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                summary["retries"] += future.result()
+                summary["upserted"] += len(batch)
+            except Exception as e:
+                print(f"[ERROR] Pinecone upsert failed for batch starting at {batch[0]['id']}: {e}")
+                summary["failed_ids"].extend(v["id"] for v in batch)
+                if dead_letter_path:
+                    write_dead_letter(dead_letter_path, batch, e, region_name=region_name)
+    return summary
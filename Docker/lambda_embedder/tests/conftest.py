@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The embedder modules are flat scripts copied into /app, so import them from the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
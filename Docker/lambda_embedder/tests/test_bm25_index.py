@@ -0,0 +1,84 @@
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    "a-body": "Rivers of Blood bleed build with arcane scaling",
+    "b-body": "Moonveil intelligence build for sorcery",
+    "c-body": "Bleed on everything: Rivers of Blood, Seppuku, bleed bleed",
+}
+
+
+def test_tokenize_lowercases_alphanumerics():
+    assert tokenize("Rivers-of-Blood +1 ARC") == ["rivers", "of", "blood", "1", "arc"]
+
+
+def test_search_ranks_by_bm25_and_ignores_unknown_terms():
+    index = BM25Index("")
+    index.add(DOCS)
+    hits = index.search("bleed rivers", top_k=5)
+    assert [vid for vid, _ in hits] == ["c-body", "a-body"]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search("malenia") == []
+    assert len(index.search("build", top_k=1)) == 1
+
+
+def test_add_replaces_text_for_same_id():
+    index = BM25Index("")
+    index.add(DOCS)
+    index.search("bleed")
+    index.add({"a-body": "Strength build with a greatsword"})
+    assert [vid for vid, _ in index.search("greatsword")] == ["a-body"]
+    assert "a-body" not in [vid for vid, _ in index.search("arcane")]
+    assert len(index) == 3
+
+
+def test_save_load_and_merge(tmp_path):
+    path = str(tmp_path / "bm25.npz")
+    index = BM25Index(path)
+    index.add({"a-body": DOCS["a-body"]})
+    index.save()
+
+    shard = BM25Index("")
+    shard.add({"b-body": DOCS["b-body"]})
+    merged = BM25Index(path).load()
+    merged.merge(shard)
+    assert [vid for vid, _ in merged.search("arcane")] == ["a-body"]
+    assert [vid for vid, _ in merged.search("sorcery")] == ["b-body"]
+
+
+def test_remove_after_chunk_count_shrink(tmp_path):
+    index = BM25Index("")
+    index.add({f"a-body-{n}": f"rivers of blood part {n} " * (n + 1) for n in range(4)})
+    index.add(DOCS)
+    index.search("rivers")
+    # the post was re-chunked into two pieces: chunks 2 and 3 are stale
+    index.add({"a-body-0": "rivers of blood", "a-body-1": "part two"})
+    index.remove({"a-body-2", "a-body-3"})
+    assert len(index) == 5
+    assert {vid for vid, _ in index.search("rivers", top_k=10)} == {"a-body", "a-body-0", "c-body"}
+    assert float(index.doc_len.mean()) == sum(len(tokenize(t)) for t in [
+        "rivers of blood", "part two", *DOCS.values()]) / 5
+
+
+def test_merge_applies_shard_removals(tmp_path):
+    path = str(tmp_path / "bm25.npz")
+    base = BM25Index(path)
+    base.add(DOCS)
+    base.save()
+
+    shard_path = str(tmp_path / "bm25.npz.shard-0")
+    shard = BM25Index(path).load()
+    shard.path = shard_path
+    shard.remove({"c-body"})
+    shard.save()
+
+    merged = BM25Index(path).load()
+    merged.merge(BM25Index(shard_path).load())
+    assert [vid for vid, _ in merged.search("bleed")] == ["a-body"]
+    merged.add({"c-body": DOCS["c-body"]})
+    assert merged.removed_ids == set()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
@@ -0,0 +1,11 @@
+from doc_store import open_doc_store
+
+
+def test_sqlite_store_put_get_delete(tmp_path):
+    store = open_doc_store(str(tmp_path / "docs" / "docs.sqlite"))
+    store.put_many({"a-body-0": "first", "a-body-1": "second", "a-body-2": "third"})
+    assert store.get_many(["a-body-0", "a-body-2", "missing"]) == {"a-body-0": "first", "a-body-2": "third"}
+
+    store.delete_many({"a-body-1", "a-body-2", "missing"})
+    assert store.get_many(["a-body-0", "a-body-1", "a-body-2"]) == {"a-body-0": "first"}
+    store.delete_many([])
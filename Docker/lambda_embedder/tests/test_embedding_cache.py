@@ -0,0 +1,67 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache, text_key
+
+
+def vec(x, dim=4):
+    return np.full(dim, x, dtype=np.float32)
+
+
+def test_get_returns_vector_and_upserted_ids():
+    cache = EmbeddingCache("", max_entries=10)
+    key = text_key("m", "hello")
+    assert cache.get(key) is None
+    cache.put(key, vec(1.0), "a-body")
+    cache.put(key, vec(1.0), "b-body")
+    cache.put(key, vec(1.0), "a-body")
+    entry = cache.get(key)
+    assert entry["values"] == [1.0] * 4
+    assert entry["ids"] == ["a-body", "b-body"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_reuses_rows():
+    cache = EmbeddingCache("", max_entries=2)
+    cache.put("a", vec(1.0), "a")
+    cache.put("b", vec(2.0), "b")
+    cache.get("a")
+    cache.put("c", vec(3.0), "c")
+    assert cache.get("b") is None
+    assert cache.get("a")["values"] == [1.0] * 4
+    assert cache.get("c") == {"values": [3.0] * 4, "ids": ["c"]}
+    assert len(cache) == 2 and len(cache.values) == 2
+
+
+def test_growth_keeps_earlier_rows():
+    cache = EmbeddingCache("", max_entries=5000)
+    for i in range(3000):
+        cache.put(str(i), vec(float(i)), str(i))
+    assert cache.get("0")["values"] == [0.0] * 4
+    assert cache.get("2999")["values"] == [2999.0] * 4
+
+
+def test_save_load_round_trip_keeps_most_recent(tmp_path):
+    path = str(tmp_path / "cache.npz")
+    cache = EmbeddingCache(path, max_entries=10)
+    for i in range(5):
+        cache.put(str(i), vec(float(i)), f"id-{i}")
+    cache.get("0")
+    cache.save()
+
+    reloaded = EmbeddingCache(path, max_entries=3).load()
+    assert list(reloaded.rows) == ["3", "4", "0"]
+    assert reloaded.values.dtype == np.float32
+    assert reloaded.get("0") == {"values": [0.0] * 4, "ids": ["id-0"]}
+    reloaded.put("5", vec(5.0), "id-5")
+    assert reloaded.get("3") is None
+
+
+def test_merge_and_forget_ids():
+    shard = EmbeddingCache("", max_entries=10)
+    shard.put("a", vec(1.0), "a-body-0")
+    merged = EmbeddingCache("", max_entries=10)
+    merged.put("a", vec(1.0), "a-body")
+    merged.merge(shard)
+    assert merged.get("a")["ids"] == ["a-body", "a-body-0"]
+    merged.forget_ids({"a-body"})
+    assert merged.get("a")["ids"] == ["a-body-0"]
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from vector_store import LocalVectorStore, matches_filter
+
+
+def vector(vid, values, **metadata):
+    return {"id": vid, "values": values, "metadata": metadata}
+
+
+def test_fetch_sees_buffered_upserts_and_deletes(tmp_path):
+    store = LocalVectorStore(str(tmp_path), use_faiss=False)
+    store.upsert([vector("a", [1.0, 0.0]), vector("b", [0.0, 1.0])])
+    assert set(store.fetch(["a", "b", "c"])["vectors"]) == {"a", "b"}
+    store.flush()
+
+    store.delete(ids=["a"])
+    assert set(store.fetch(["a", "b"])["vectors"]) == {"b"}
+    store.flush()
+    assert store.ids == ["b"]
+    assert LocalVectorStore(str(tmp_path), use_faiss=False).describe_index_stats()["total_vector_count"] == 1
+
+
+def test_upsert_after_delete_keeps_vector(tmp_path):
+    store = LocalVectorStore(str(tmp_path), use_faiss=False)
+    store.upsert([vector("a", [1.0, 0.0], chunk_count=2)])
+    store.flush()
+    store.delete(ids=["a"])
+    store.upsert([vector("a", [0.0, 2.0], chunk_count=3)])
+    store.flush()
+
+    fetched = store.fetch(["a"])["vectors"]["a"]
+    assert fetched["metadata"]["chunk_count"] == 3
+    np.testing.assert_allclose(fetched["values"], [0.0, 1.0])
+
+
+def seeded_store(path, use_faiss=False):
+    store = LocalVectorStore(path, use_faiss=use_faiss)
+    store.upsert([
+        vector("old", [1.0, 0.0, 0.0], timestamp=100, type="post"),
+        vector("new", [0.9, 0.1, 0.0], timestamp=300, type="comment"),
+        vector("far", [0.0, 0.0, 1.0], timestamp=200, type="post"),
+        vector("undated", [0.8, 0.2, 0.0], type="post"),
+    ])
+    store.flush()
+    return store
+
+
+def test_query_orders_by_cosine(tmp_path):
+    store = seeded_store(str(tmp_path))
+    matches = store.query([2.0, 0.0, 0.0], top_k=2, include_metadata=True)["matches"]
+    assert [m["id"] for m in matches] == ["old", "new"]
+    assert matches[0]["score"] == pytest.approx(1.0)
+    assert matches[0]["metadata"]["type"] == "post"
+
+
+def test_filters_match_pinecone_operators(tmp_path):
+    store = seeded_store(str(tmp_path))
+    q = [1.0, 0.0, 0.0]
+    # Range conditions never match a missing field
+    assert [m["id"] for m in store.query(q, top_k=5, filter={"timestamp": {"$gte": 200}})["matches"]] == \
+        ["new", "far"]
+    assert [m["id"] for m in store.query(q, top_k=5, filter={"type": {"$in": ["comment"]}})["matches"]] == ["new"]
+    assert [m["id"] for m in store.query(q, top_k=5, filter={"type": "post", "timestamp": {"$lt": 150}})[
+        "matches"]] == ["old"]
+    assert store.query(q, top_k=5, filter={"timestamp": {"$gt": 1000}})["matches"] == []
+    assert not matches_filter({"timestamp": "soon"}, {"timestamp": {"$gte": 1}})
+    with pytest.raises(ValueError):
+        matches_filter({}, {"type": {"$regex": "p.*"}})
+
+
+def test_hnsw_index_matches_brute_force(tmp_path):
+    pytest.importorskip("faiss")
+    exact = seeded_store(str(tmp_path / "exact"))
+    hnsw = seeded_store(str(tmp_path / "hnsw"), use_faiss=True)
+    assert hnsw.faiss_index is not None
+    for flt in (None, {"type": "post"}, {"timestamp": {"$gte": 200}}):
+        expected = [m["id"] for m in exact.query([1.0, 0.0, 0.0], top_k=2, filter=flt)["matches"]]
+        assert [m["id"] for m in hnsw.query([1.0, 0.0, 0.0], top_k=2, filter=flt)["matches"]] == expected
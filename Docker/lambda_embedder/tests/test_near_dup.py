@@ -0,0 +1,84 @@
+from near_dup import SignatureStore
+
+BUILD = ("Rivers of Blood bleed build with Seppuku on the katana, arcane scaling, "
+         "Lord of Blood's Exultation and Shard of Alexander for the DLC bosses")
+OTHER = "Moonveil intelligence build with Carian Slicer and Radagon's Soreseal for sorcery damage and mobility"
+
+
+def record(vid, text):
+    return {"id": vid, "text": text}
+
+
+def test_exact_duplicate_in_batch_is_dropped():
+    store = SignatureStore("")
+    kept, dropped, sigs = store.deduplicate([record("a-body", BUILD), record("b-body", BUILD), record("c-body", OTHER)])
+    assert [r["id"] for r in kept] == ["a-body", "c-body"]
+    assert [(r["id"], canonical) for r, canonical, _ in dropped] == [("b-body", "a-body")]
+    assert set(sigs) == {"a-body", "c-body"}
+
+
+def test_duplicate_of_stored_text_is_dropped_after_save_and_load(tmp_path):
+    path = str(tmp_path / "signatures.npz")
+    store = SignatureStore(path)
+    _, _, sigs = store.deduplicate([record("a-body", BUILD)])
+    store.add(sigs)
+    store.save()
+
+    reloaded = SignatureStore(path).load()
+    kept, dropped, _ = reloaded.deduplicate([record("b-body", BUILD), record("c-body", OTHER)])
+    assert [r["id"] for r in kept] == ["c-body"]
+    assert dropped[0][1] == "a-body"
+
+
+def test_same_id_is_never_its_own_duplicate(tmp_path):
+    path = str(tmp_path / "signatures.npz")
+    store = SignatureStore(path)
+    _, _, sigs = store.deduplicate([record("a-body", BUILD)])
+    store.add(sigs)
+
+    # Pending (not yet saved) signature under the same id
+    kept, dropped, _ = store.deduplicate([record("a-body", BUILD + " edited")])
+    assert [r["id"] for r in kept] == ["a-body"] and not dropped
+
+    # Persisted signature under the same id
+    store.save()
+    kept, dropped, _ = SignatureStore(path).load().deduplicate([record("a-body", BUILD)])
+    assert [r["id"] for r in kept] == ["a-body"] and not dropped
+
+
+def test_save_keeps_latest_signature_per_id(tmp_path):
+    path = str(tmp_path / "signatures.npz")
+    store = SignatureStore(path)
+    store.add(store.deduplicate([record("a-body", BUILD)])[2])
+    store.add({"a-body": store.signature(OTHER)})
+    store.save()
+
+    reloaded = SignatureStore(path).load()
+    assert reloaded.ids == ["a-body"]
+    kept, dropped, _ = reloaded.deduplicate([record("b-body", OTHER)])
+    assert not kept and dropped[0][1] == "a-body"
+
+
+def test_other_chunking_of_same_source_is_not_a_duplicate():
+    store = SignatureStore("")
+    store.add(store.deduplicate([record("a-body", BUILD)])[2])
+    chunk = {"id": "a-body-0", "text": BUILD, "metadata": {"parent_id": "a-body", "chunk_index": 0}}
+    kept, dropped, _ = store.deduplicate([chunk, record("a-body-comment", BUILD)])
+    assert [r["id"] for r in kept] == ["a-body-0"]
+    assert dropped[0][1] == "a-body"
+
+    # And back: the unchunked text is not a duplicate of its old chunks
+    store.add({"a-body-0": store.signature(BUILD)})
+    assert not store.deduplicate([record("a-body", BUILD)])[1]
+
+
+def test_discarded_signature_no_longer_matches(tmp_path):
+    path = str(tmp_path / "signatures.npz")
+    store = SignatureStore(path)
+    store.add(store.deduplicate([record("a-body-3", BUILD)])[2])
+    store.discard({"a-body-3"})
+    assert not store.deduplicate([record("b-body", BUILD)])[1]
+
+    store.add({"c-body": store.signature(OTHER)})
+    store.save()
+    assert SignatureStore(path).load().ids == ["c-body"]
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import pinecone_upsert
+from pinecone_upsert import batch_by_bytes, upsert_vectors, vector_size_bytes
+
+
+def vector(vid, dim=8, text=""):
+    return {"id": vid, "values": [0.1] * dim, "metadata": {"full_text": text}}
+
+
+class FlakyIndex:
+    """upsert() fails for the first `failures` calls, then records batches"""
+
+    def __init__(self, failures=0, always_fail_ids=()):
+        self.failures = failures
+        self.always_fail_ids = set(always_fail_ids)
+        self.batches = []
+
+    def upsert(self, vectors):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("429 Too Many Requests")
+        if any(v["id"] in self.always_fail_ids for v in vectors):
+            raise RuntimeError("400 Bad Request")
+        self.batches.append([v["id"] for v in vectors])
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(pinecone_upsert.time, "sleep", lambda seconds: None)
+
+
+def test_batches_stay_under_byte_limit():
+    vectors = [vector(f"v{i}", text="x" * (200 if i % 3 else 2000)) for i in range(50)]
+    max_bytes = 5000
+    batches = batch_by_bytes(vectors, max_bytes=max_bytes)
+    assert [v["id"] for b in batches for v in b] == [v["id"] for v in vectors]
+    assert len(batches) > 1
+    for batch in batches:
+        assert len(batch) == 1 or sum(vector_size_bytes(v) for v in batch) <= max_bytes
+
+
+def test_batches_respect_vector_count_and_oversized_vectors():
+    assert [len(b) for b in batch_by_bytes([vector(f"v{i}") for i in range(5)], max_vectors=2)] == [2, 2, 1]
+    # A vector bigger than the limit still goes out, alone in its batch
+    big = vector("big", text="x" * 10000)
+    assert [[v["id"] for v in b] for b in batch_by_bytes([vector("a"), big, vector("b")], max_bytes=2000)] == \
+        [["a"], ["big"], ["b"]]
+
+
+def test_transient_failures_are_retried():
+    index = FlakyIndex(failures=2)
+    summary = upsert_vectors(index, [vector("a"), vector("b")], concurrency=1, max_retries=3)
+    assert summary == {"batches": 1, "upserted": 2, "retries": 2, "failed_ids": []}
+    assert index.batches == [["a", "b"]]
+
+
+def test_exhausted_batch_is_dead_lettered(tmp_path):
+    path = tmp_path / "dead_letter.jsonl"
+    index = FlakyIndex(always_fail_ids={"bad"})
+    vectors = [vector("good"), vector("bad", text="x" * 3000)]
+    summary = upsert_vectors(index, vectors, concurrency=2, max_bytes=2000, max_retries=1,
+                             dead_letter_path=str(path))
+    assert summary["upserted"] == 1 and summary["failed_ids"] == ["bad"]
+    assert index.batches == [["good"]]
+
+    record = json.loads(path.read_text(encoding="utf-8"))
+    assert [v["id"] for v in record["vectors"]] == ["bad"]
+    assert "400" in record["error"]
+
+
+def test_dead_letter_uses_configured_region(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pinecone_upsert, "write_dead_letter",
+                        lambda path, batch, error, region_name="us-east-1": calls.append((path, region_name)))
+    upsert_vectors(FlakyIndex(always_fail_ids={"bad"}), [vector("bad")], max_retries=0,
+                   dead_letter_path="s3://bucket/dead_letter/", region_name="eu-west-1")
+    assert calls == [("s3://bucket/dead_letter/", "eu-west-1")]
@@ -0,0 +1,254 @@
+import os
+import json
+import operator
+import threading
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # optional: brute-force NumPy search is fast enough for our corpus
+    faiss = None
+
+
+RANGE_OPS = {
+    "$eq": operator.eq, "$ne": operator.ne,
+    "$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le,
+}
+
+
+def matches_filter(metadata, flt):
+    """Evaluate the subset of Pinecone's metadata filter language we use against one metadata dict.
+
+    {field: value} or {field: {"$gte": x, "$lt": y, "$in": [...], ...}}; fields are ANDed.
+    """
+    for field, cond in (flt or {}).items():
+        value = metadata.get(field)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, target in cond.items():
+            if op == "$in":
+                ok = value in target
+            elif op == "$nin":
+                ok = value not in target
+            elif op in RANGE_OPS:
+                try:
+                    ok = bool(RANGE_OPS[op](value, target))
+                except TypeError:  # missing or non-numeric value never matches a range
+                    ok = False
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+            if not ok:
+                return False
+    return True
+
+
+class LocalVectorStore:
+    """Local drop-in for a Pinecone index.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.npy) with ids and
+    metadata in JSON sidecars; an HNSW index (index.faiss) is built on flush when
+    faiss is installed. upsert/query/fetch/delete take and return the same shapes
+    as the Pinecone client, so callers do not need to know which backend they hold.
+    Upserts and deletes are buffered until flush; fetch already sees them.
+    Scores are cosine similarity, matching our Pinecone index metric.
+    """
+
+    def __init__(self, path, use_faiss=None, hnsw_m=32, ef_search=64):
+        self.path = path
+        self.use_faiss = (faiss is not None) if use_faiss is None else (use_faiss and faiss is not None)
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.deleted = set()
+        self.ids = []
+        self.metadata = []
+        self.matrix = None
+        self.id_to_row = {}
+        self.faiss_index = None
+        self.columns = {}
+        self._load()
+
+    # ---------------------- persistence ----------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if not os.path.exists(self._file("vectors.npy")):
+            return
+        self.matrix = np.load(self._file("vectors.npy"), mmap_mode="r")
+        with open(self._file("ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        with open(self._file("metadata.jsonl"), "r", encoding="utf-8") as f:
+            self.metadata = [json.loads(line) for line in f]
+        self.id_to_row = {vid: row for row, vid in enumerate(self.ids)}
+        if self.use_faiss and os.path.exists(self._file("index.faiss")):
+            self.faiss_index = faiss.read_index(self._file("index.faiss"))
+            self.faiss_index.hnsw.efSearch = self.ef_search
+
+    def flush(self):
+        """Merge pending upserts into the on-disk matrix and sidecars."""
+        with self.lock:
+            if not self.pending and not self.deleted:
+                return 0
+            pending, self.pending = self.pending, {}
+            deleted, self.deleted = self.deleted, set()
+
+            ids = list(self.ids)
+            metadata = list(self.metadata)
+            rows = [] if self.matrix is None else [np.asarray(self.matrix)]
+            new_values = []
+            updates = {}
+            for vid, (values, meta) in pending.items():
+                if vid in self.id_to_row:
+                    updates[self.id_to_row[vid]] = values
+                    metadata[self.id_to_row[vid]] = meta
+                else:
+                    ids.append(vid)
+                    metadata.append(meta)
+                    new_values.append(values)
+
+            matrix = np.vstack(rows + ([np.asarray(new_values, dtype=np.float32)] if new_values else []))
+            if updates:
+                matrix = np.array(matrix)
+                for row, values in updates.items():
+                    matrix[row] = values
+            if deleted:
+                keep = [row for row, vid in enumerate(ids) if vid not in deleted]
+                ids = [ids[row] for row in keep]
+                metadata = [metadata[row] for row in keep]
+                matrix = matrix[keep]
+
+            os.makedirs(self.path, exist_ok=True)
+            tmp = self._file("vectors.tmp.npy")
+            np.save(tmp, matrix)
+            with open(self._file("ids.json"), "w", encoding="utf-8") as f:
+                json.dump(ids, f)
+            with open(self._file("metadata.jsonl"), "w", encoding="utf-8") as f:
+                for meta in metadata:
+                    f.write(json.dumps(meta) + "\n")
+            os.replace(tmp, self._file("vectors.npy"))
+
+            if self.use_faiss:
+                hnsw = faiss.IndexHNSWFlat(matrix.shape[1], self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                hnsw.add(np.ascontiguousarray(matrix))
+                faiss.write_index(hnsw, self._file("index.faiss"))
+
+            self.matrix = None
+            self.faiss_index = None
+            self.columns = {}
+            self._load()
+            print(f"[INFO] Flushed {len(pending)} vectors and {len(deleted)} deletes to local index {self.path} "
+                  f"({len(self.ids)} total)")
+            return len(pending) + len(deleted)
+
+    # ---------------------- Pinecone-compatible API ----------------------
+
+    def upsert(self, vectors):
+        with self.lock:
+            for v in vectors:
+                values = np.asarray(v["values"], dtype=np.float32)
+                norm = np.linalg.norm(values)
+                self.pending[v["id"]] = (values / norm if norm else values, v.get("metadata", {}))
+                self.deleted.discard(v["id"])
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids):
+        with self.lock:
+            for vid in ids:
+                self.pending.pop(vid, None)
+                if vid in self.id_to_row:
+                    self.deleted.add(vid)
+        return {}
+
+    def fetch(self, ids):
+        found = {}
+        with self.lock:
+            for vid in ids:
+                if vid in self.pending:
+                    values, metadata = self.pending[vid]
+                    found[vid] = {"id": vid, "values": values.tolist(), "metadata": metadata}
+                    continue
+                row = self.id_to_row.get(vid)
+                if row is not None and vid not in self.deleted:
+                    found[vid] = {"id": vid, "values": self.matrix[row].tolist(), "metadata": self.metadata[row]}
+        return {"vectors": found}
+
+    def describe_index_stats(self):
+        dim = 0 if self.matrix is None else int(self.matrix.shape[1])
+        return {"dimension": dim, "total_vector_count": len(self.ids)}
+
+    def _column(self, field):
+        """Numeric metadata field as a float array (NaN where missing), cached until the next flush."""
+        if field not in self.columns:
+            values = np.full(len(self.metadata), np.nan)
+            for row, meta in enumerate(self.metadata):
+                value = meta.get(field)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values[row] = value
+            self.columns[field] = values
+        return self.columns[field]
+
+    def filter_mask(self, flt):
+        """Boolean row mask for a metadata filter; numeric range conditions are vectorized."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, cond in flt.items():
+            numeric = isinstance(cond, dict) and all(
+                op in RANGE_OPS and op != "$ne" and isinstance(t, (int, float)) for op, t in cond.items()
+            )
+            if numeric:
+                column = self._column(field)
+                with np.errstate(invalid="ignore"):
+                    for op, target in cond.items():
+                        mask &= RANGE_OPS[op](column, target)
+            else:
+                mask &= np.fromiter((matches_filter(m, {field: cond}) for m in self.metadata),
+                                    dtype=bool, count=len(self.metadata))
+        return mask
+
+    def query(self, vector, top_k=5, include_metadata=False, include_values=False, filter=None):
+        if self.matrix is None or not self.ids:
+            return {"matches": []}
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        k = min(top_k, len(self.ids))
+        mask = self.filter_mask(filter) if filter else None
+
+        if self.faiss_index is not None:
+            # HNSW cannot prefilter, so over-fetch and widen until k rows pass the filter
+            fetch_k = k if mask is None else min(k * 4, len(self.ids))
+            while True:
+                scores, rows = self.faiss_index.search(q[None, :], fetch_k)
+                hits = [(int(r), float(s)) for r, s in zip(rows[0], scores[0])
+                        if r >= 0 and (mask is None or mask[r])]
+                if len(hits) >= k or fetch_k >= len(self.ids):
+                    break
+                fetch_k = min(fetch_k * 4, len(self.ids))
+            hits = hits[:k]
+        else:
+            rows = np.arange(len(self.ids)) if mask is None else np.flatnonzero(mask)
+            if not len(rows):
+                return {"matches": []}
+            k = min(k, len(rows))
+            if len(rows) > len(self.ids) // 4:
+                # Broad filter: copying most of the matrix costs more than scoring all of it
+                sims = (self.matrix @ q)[rows]
+            else:
+                sims = self.matrix[rows] @ q
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            hits = [(int(rows[i]), float(sims[i])) for i in top]
+
+        matches = []
+        for row, score in hits:
+            match = {"id": self.ids[row], "score": score}
+            if include_metadata:
+                match["metadata"] = self.metadata[row]
+            if include_values:
+                match["values"] = self.matrix[row].tolist()
+            matches.append(match)
+        return {"matches": matches}
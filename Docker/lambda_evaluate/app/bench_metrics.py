@@ -0,0 +1,83 @@
+"""Microbenchmark of per-query metric cost: original per-call metrics vs RagScorer.
+
+    python bench_metrics.py --queries 200
+"""
+import random
+import argparse
+import time
+
+import pandas as pd
+from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from rouge_score import rouge_scorer
+
+from metrics import RagScorer
+
+WORDS = (
+    "the venomous fang is a claw weapon that causes poison buildup with occult affinity "
+    "rivers of blood bleed katana arcane scaling blasphemous blade takers flame faith "
+    "strength two handed spirit ashes mimic tear incantations dlc shadow of the erdtree"
+).split()
+
+
+def legacy_metrics(reference, generated, chunks):
+    """The metric code evaluate() ran per query before RagScorer."""
+    context_text = " ".join(chunks).lower()
+    answer_tokens = [w for w in word_tokenize(generated.lower()) if w.isalnum()]
+    answer_tokens = [w for w in answer_tokens if w not in stopwords.words("english")]
+    overlap = sum(1 for w in answer_tokens if w in context_text) / max(len(answer_tokens), 1)
+
+    rouge = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True)
+    rouge.score(reference, generated)
+    sentence_bleu([reference.split()], generated.split(), smoothing_function=SmoothingFunction().method4)
+
+    stop_words = set(stopwords.words("english"))
+    ref_keywords = {w for w in word_tokenize(reference.lower()) if w.isalnum() and w not in stop_words}
+    gen_keywords = {w for w in word_tokenize(generated.lower()) if w.isalnum()}
+    return overlap, len(ref_keywords & gen_keywords)
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+
+    def text(lo, hi):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+
+    return pd.DataFrame([
+        {"reference": text(15, 40), "generated": text(80, 250), "chunks": [text(50, 400) for _ in range(5)]}
+        for _ in range(n)
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    df = make_rows(args.queries)
+    rows = list(zip(df["reference"], df["generated"], df["chunks"]))
+
+    start = time.perf_counter()
+    for row in rows:
+        legacy_metrics(*row)
+    legacy = time.perf_counter() - start
+
+    scorer = RagScorer()
+    start = time.perf_counter()
+    for row in rows:
+        scorer.score(*row)
+    reused = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scorer.score_frame(df)
+    framed = time.perf_counter() - start
+
+    n = len(rows)
+    print(f"legacy per-call metrics : {legacy / n * 1000:7.2f} ms/query")
+    print(f"RagScorer.score         : {reused / n * 1000:7.2f} ms/query  (x{legacy / reused:.1f})")
+    print(f"RagScorer.score_frame   : {framed / n * 1000:7.2f} ms/query  ({n} rows)")
+
+
+if __name__ == "__main__":
+    main()
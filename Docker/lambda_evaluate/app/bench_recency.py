@@ -0,0 +1,80 @@
+"""Latency of recency-filtered and time-decayed retrieval against unfiltered retrieval.
+
+Runs rag_utils.query_index over a synthetic local index whose timestamps span
+--span-days (or the configured index with --use-configured-index):
+
+    python bench_recency.py --vectors 100000 --window-days 30 365 --half-life-days 90
+"""
+import io
+import os
+import time
+import argparse
+import tempfile
+import contextlib
+
+import numpy as np
+
+
+def build_synthetic_index(path, n_vectors, dim, span_days, seed=0):
+    from vector_store import LocalVectorStore
+
+    rng = np.random.default_rng(seed)
+    now = int(time.time())
+    store = LocalVectorStore(path)
+    for start in range(0, n_vectors, 10000):
+        n = min(10000, n_vectors - start)
+        values = rng.standard_normal((n, dim)).astype(np.float32)
+        timestamps = now - rng.integers(0, span_days * 86400, size=n)
+        store.upsert([
+            {"id": f"bench{start + i}", "values": values[i],
+             "metadata": {"timestamp": int(timestamps[i]), "full_text": f"bench post {start + i}"}}
+            for i in range(n)
+        ])
+    store.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--span-days", type=int, default=730)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--window-days", type=float, nargs="+", default=[30, 365])
+    parser.add_argument("--half-life-days", type=float, default=90)
+    parser.add_argument("--use-configured-index", action="store_true")
+    args = parser.parse_args()
+
+    if not args.use_configured_index:
+        os.environ["VECTOR_STORE"] = "local"
+        os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp()
+        build_synthetic_index(os.environ["LOCAL_INDEX_DIR"], args.vectors, args.dim, args.span_days)
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    import rag_utils
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32).tolist()
+
+    def run(window_days, half_life_days):
+        timings, returned = [], []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for q in queries:
+                start = time.perf_counter()
+                matches = rag_utils.query_index("", q, args.top_k, False, window_days, half_life_days)
+                timings.append(time.perf_counter() - start)
+                returned.append(len(matches))
+        return np.percentile(timings, 50) * 1000, np.percentile(timings, 95) * 1000, np.mean(returned)
+
+    print(f"{'mode':<28} {'p50 ms':>8} {'p95 ms':>8} {'vs base':>8} {'filled':>7}")
+    base_p50, base_p95, filled = run(0, 0)
+    print(f"{'unfiltered':<28} {base_p50:8.2f} {base_p95:8.2f} {1.0:8.2f} {filled:7.1f}")
+    cases = [(f"window {w:g}d", w, 0) for w in args.window_days]
+    cases.append((f"decay half-life {args.half_life_days:g}d", 0, args.half_life_days))
+    cases += [(f"window {w:g}d + decay", w, args.half_life_days) for w in args.window_days]
+    for label, window_days, half_life_days in cases:
+        p50, p95, filled = run(window_days, half_life_days)
+        print(f"{label:<28} {p50:8.2f} {p95:8.2f} {p50 / base_p50:8.2f} {filled:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Latency benchmark for rerank_documents against the local mock OpenAI server.
+
+    python bench_rerank.py --docs 20 --latency-ms 800 --repeats 3
+"""
+import os
+import argparse
+import statistics
+import time
+
+from mock_openai import start_mock_openai
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 20])
+    args = parser.parse_args()
+
+    server, base_url = start_mock_openai(args.latency_ms / 1000, args.jitter_ms / 1000)
+    # rag_utils builds its OpenAI client at import time, so point it at the mock first
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ.setdefault("VECTOR_STORE", "local")
+    import rag_utils
+
+    query = "What is the best bleed build after the DLC?"
+    docs = [f"Passage {i}: Rivers of Blood with Seppuku and the Lord of Blood's Exultation talisman." for i in range(args.docs)]
+
+    def run(label, **kwargs):
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            rag_utils.rerank_documents(query, docs, **kwargs)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:<24} median {statistics.median(timings):6.2f}s  "
+              f"min {min(timings):6.2f}s  max {max(timings):6.2f}s")
+
+    print(f"[INFO] {args.docs} passages, mock latency {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms")
+    for workers in args.concurrency:
+        run(f"pointwise workers={workers}", max_workers=workers)
+    run("listwise (1 call)", mode="listwise")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
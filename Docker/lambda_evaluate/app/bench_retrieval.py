@@ -0,0 +1,306 @@
+"""Offline retrieval quality and speed: recall@k, MRR and nDCG@k with QPS and latency percentiles.
+
+Runs rag_utils.get_top_matches over labelled queries, without any GPT-4 calls.
+A frozen snapshot is a directory holding a LocalVectorStore index (gen_embeddings
+run with VECTOR_STORE=local LOCAL_INDEX_DIR=<dir> BM25_INDEX_PATH=<dir>/bm25.npz)
+and labels.json, a list of
+
+    {"query": "...", "relevant_ids": ["1dabc12-body", ...], "relevance": {"1dabc12-body": 2}}
+
+relevant_ids may name vector ids or the post/record ids they were chunked from
+("1dabc12" matches "1dabc12-body-0"); the optional relevance grades feed nDCG
+(default 1). --synthetic-docs writes a synthetic snapshot first, and
+--use-configured-index queries whatever backend the environment configures:
+
+    python bench_retrieval.py --snapshot snapshots/synthetic --synthetic-docs 5000
+    python bench_retrieval.py --snapshot snapshots/synthetic --modes dense hybrid --k 1 5 10
+    python bench_retrieval.py --use-configured-index --labels labels.json --compare retrieval_benchmark_summary.csv
+
+Per-query rows and a one-row-per-mode summary (with snapshot/labels fingerprints and
+the retrieval config, so runs are comparable) are written to CSV and uploaded under
+the same {yyyy}/{mm}/{dd}/ prefix evaluate.main uses.
+"""
+import io
+import os
+import json
+import math
+import time
+import zlib
+import random
+import argparse
+import contextlib
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import numpy as np
+import pandas as pd
+
+ITEMS = ["Rivers of Blood", "Moonveil", "Blasphemous Blade", "Mohgwyn's Sacred Spear", "Dark Moon Greatsword",
+         "Sword of Night and Flame", "Venomous Fang", "Bloodhound's Fang", "Giant-Crusher",
+         "Starscourge Greatsword", "Eleonora's Poleblade", "Hand of Malenia"]
+ARCHETYPES = ["bleed", "strength", "dexterity", "faith", "intelligence", "arcane", "quality", "frost", "poison"]
+EXTRAS = ["Shard of Alexander", "Lord of Blood's Exultation", "Godfrey Icon", "Rotten Winged Sword Insignia",
+          "Radagon's Soreseal", "Millicent's Prosthesis", "Seppuku", "Golden Vow", "Flame, Grant Me Strength",
+          "Bloodflame Blade", "Rock Sling", "Comet Azur"]
+
+
+# ---------------------- snapshot ----------------------
+
+def make_synthetic_snapshot(path, n_docs, n_queries, encoder, seed=0):
+    """Write build posts, their BM25 index and single-relevant-doc labels into a snapshot directory.
+
+    Each post names one weapon, archetype and three extras; each query asks for one
+    post's weapon, archetype and two of its extras, which few other posts share.
+    """
+    from vector_store import LocalVectorStore
+    from bm25_index import BM25Index
+
+    rng = random.Random(seed)
+    texts, metadata = {}, {}
+    for i in range(n_docs):
+        item, archetype = rng.choice(ITEMS), rng.choice(ARCHETYPES)
+        extras = rng.sample(EXTRAS, 3)
+        vid = f"synth{i:06d}-body"
+        texts[vid] = (f"My {archetype} {item} build for NG+{rng.randint(0, 7)}: I run {extras[0]} and "
+                      f"{extras[1]}, and swap in {extras[2]} for bosses. Level {rng.randint(80, 200)}.")
+        metadata[vid] = {"item": item, "archetype": archetype, "extras": extras[:2]}
+
+    ids = list(texts)
+    store = LocalVectorStore(path)
+    for start in range(0, n_docs, 1000):
+        batch = ids[start:start + 1000]
+        values = encoder.encode([texts[vid] for vid in batch], batch_size=64)
+        store.upsert([
+            {"id": vid, "values": np.asarray(vec, dtype=np.float32),
+             "metadata": {"full_text": texts[vid], "url": f"https://reddit.com/r/EldenringBuilds/{vid}",
+                          "author": f"user{n % 1000}", "timestamp": 1718000000 + n * 60}}
+            for n, (vid, vec) in enumerate(zip(batch, values), start=start)
+        ])
+    store.flush()
+
+    bm25 = BM25Index(os.path.join(path, "bm25.npz"))
+    bm25.add(texts)
+    bm25.save()
+
+    labels = []
+    for vid in rng.sample(ids, min(n_queries, n_docs)):
+        meta = metadata[vid]
+        labels.append({
+            "query": f"{meta['archetype']} {meta['item']} build with {meta['extras'][0]} and {meta['extras'][1]}",
+            "relevant_ids": [vid],
+        })
+    with open(os.path.join(path, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump(labels, f, indent=2)
+    print(f"[INFO] Wrote synthetic snapshot with {n_docs} docs and {len(labels)} labelled queries to {path}")
+
+
+def fingerprint(path):
+    """crc32 of a file's bytes, so summaries show whether two runs used the same snapshot/labels"""
+    crc = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(block, crc)
+    return f"{crc:08x}"
+
+
+# ---------------------- metrics ----------------------
+
+def label_of(vid, relevance):
+    """The labelled id a retrieved vector id belongs to: itself, or the record/post it was chunked from"""
+    while vid:
+        if vid in relevance:
+            return vid
+        vid = vid.rpartition("-")[0]
+    return None
+
+
+def score_ranking(ranked_ids, relevance, ks):
+    """recall@k for each k, reciprocal rank and nDCG@max(ks); each labelled id counts once"""
+    labels = []
+    for vid in ranked_ids:
+        label = label_of(vid, relevance)
+        labels.append(label if label not in labels else None)
+    row = {}
+    for k in ks:
+        row[f"recall@{k}"] = len({l for l in labels[:k] if l}) / len(relevance)
+    first = next((rank for rank, label in enumerate(labels, start=1) if label), None)
+    row["rr"] = 1.0 / first if first else 0.0
+
+    k = max(ks)
+    dcg = sum((2 ** relevance[l] - 1) / math.log2(rank + 2) for rank, l in enumerate(labels[:k]) if l)
+    ideal = sorted(relevance.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(rank + 2) for rank, g in enumerate(ideal))
+    row[f"ndcg@{k}"] = dcg / idcg if idcg else 0.0
+    return row
+
+
+# ---------------------- results ----------------------
+
+def save_results(df, name, bucket, timestamp):
+    """Write name.csv locally and upload it as {yyyy}/{mm}/{dd}/name_{ts}.csv, the evaluate.main layout"""
+    output_file = f"{name}.csv"
+    df.to_csv(output_file, index=False)
+    s3_key = f"{timestamp.year}/{timestamp.month:02d}/{timestamp.day:02d}/{name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.csv"
+    if not bucket:
+        print(f"📁 Results saved locally as: {output_file}")
+        return
+    try:
+        boto3.client("s3", region_name="us-east-1").upload_file(output_file, bucket, s3_key)
+        print(f"✅ Results saved to s3://{bucket}/{s3_key}")
+    except Exception as e:
+        print(f"❌ Error uploading to S3: {e}")
+        print(f"📁 Results saved locally as: {output_file}")
+
+
+def read_csv(path):
+    if path.startswith("s3://"):
+        bucket, _, key = path[len("s3://"):].partition("/")
+        body = boto3.client("s3", region_name="us-east-1").get_object(Bucket=bucket, Key=key)["Body"].read()
+        return pd.read_csv(io.BytesIO(body))
+    return pd.read_csv(path)
+
+
+def print_comparison(summary, baseline_path, metric_columns):
+    """Deltas against an earlier summary CSV for the modes both runs share"""
+    baseline = read_csv(baseline_path).set_index("mode")
+    for _, row in summary.iterrows():
+        if row["mode"] not in baseline.index:
+            continue
+        base = baseline.loc[row["mode"]]
+        for column in ("snapshot_fingerprint", "labels_fingerprint", "embedding_backend"):
+            if column in base and str(base[column]) != str(row[column]):
+                print(f"[WARN] {row['mode']}: {column} differs from baseline ({base[column]} vs {row[column]})")
+        deltas = ", ".join(f"{c} {row[c] - base[c]:+.4f}" for c in metric_columns if c in base)
+        print(f"vs baseline [{row['mode']}]: {deltas}")
+
+
+# ---------------------- benchmark ----------------------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshot", help="snapshot directory (local index, bm25.npz, labels.json)")
+    parser.add_argument("--labels", help="labelled queries; defaults to <snapshot>/labels.json")
+    parser.add_argument("--use-configured-index", action="store_true",
+                        help="query the backend configured by VECTOR_STORE/INDEX_NAME instead of a snapshot")
+    parser.add_argument("--synthetic-docs", type=int, default=0, help="first write a synthetic snapshot of N docs")
+    parser.add_argument("--synthetic-queries", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=None, help="dense and/or hybrid (default: RETRIEVAL_MODE)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--rerank", action="store_true")
+    parser.add_argument("--repeats", type=int, default=3, help="timed passes; caches are cleared before each")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--bucket", default=os.environ.get("S3_BUCKET_NAME", ""))
+    parser.add_argument("--compare", help="earlier retrieval_benchmark_summary CSV (local or s3://) to diff against")
+    args = parser.parse_args()
+    if not args.use_configured_index and not args.snapshot:
+        parser.error("--snapshot is required unless --use-configured-index is set")
+    if args.use_configured_index and not (args.labels or args.snapshot):
+        parser.error("--labels is required with --use-configured-index")
+    if args.synthetic_docs and not args.snapshot:
+        parser.error("--synthetic-docs needs --snapshot to write to")
+
+    # rag_utils reads its configuration at import time
+    if not args.use_configured_index:
+        os.makedirs(args.snapshot, exist_ok=True)
+        os.environ["VECTOR_STORE"] = "local"
+        os.environ["LOCAL_INDEX_DIR"] = args.snapshot
+        bm25_path = os.path.join(args.snapshot, "bm25.npz")
+        if args.synthetic_docs or os.path.exists(bm25_path):
+            os.environ["BM25_INDEX_PATH"] = bm25_path
+    if args.modes and "hybrid" in args.modes and not os.environ.get("BM25_INDEX_PATH"):
+        parser.error("hybrid mode needs BM25_INDEX_PATH or a snapshot with bm25.npz")
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    import rag_utils
+
+    if args.synthetic_docs:
+        from vector_store import LocalVectorStore
+        make_synthetic_snapshot(args.snapshot, args.synthetic_docs, args.synthetic_queries, rag_utils.embedding_model)
+        rag_utils.index = LocalVectorStore(args.snapshot)
+
+    labels_path = args.labels or os.path.join(args.snapshot, "labels.json")
+    with open(labels_path, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    for case in cases:
+        case["relevance"] = case.get("relevance") or {vid: 1 for vid in case["relevant_ids"]}
+    top_k = max(args.k)
+    timestamp = datetime.now(timezone.utc)
+    vectors = rag_utils.index.describe_index_stats()["total_vector_count"]
+    config = {
+        "timestamp": timestamp.isoformat(),
+        "index": args.snapshot if not args.use_configured_index else f"{rag_utils.VECTOR_STORE}:{rag_utils.INDEX_NAME}",
+        "snapshot_vectors": vectors,
+        "snapshot_fingerprint": fingerprint(os.path.join(args.snapshot, "ids.json")) if not args.use_configured_index else "",
+        "labels_fingerprint": fingerprint(labels_path),
+        "embedding_model": rag_utils.EMBEDDING_MODEL,
+        "embedding_backend": rag_utils.EMBEDDING_BACKEND,
+        "rerank": args.rerank,
+        "rerank_method": rag_utils.RERANK_METHOD if args.rerank else "",
+        "top_k": top_k,
+        "repeats": args.repeats,
+        "concurrency": args.concurrency,
+    }
+    print(f"[INFO] {len(cases)} labelled queries against {config['index']} ({vectors} vectors)")
+
+    def retrieve(case):
+        start = time.perf_counter()
+        _, _, _, ids = rag_utils.get_top_matches(case["query"], top_k=top_k, rerank=args.rerank,
+                                                 window_days=0, half_life_days=0, return_ids=True)
+        return ids, time.perf_counter() - start
+
+    rows, summaries = [], []
+    for mode in args.modes or [rag_utils.RETRIEVAL_MODE]:
+        rag_utils.RETRIEVAL_MODE = mode
+        # One untimed query loads the model, index and BM25 postings
+        with contextlib.redirect_stdout(io.StringIO()):
+            retrieve(cases[0])
+
+        latencies = np.zeros((args.repeats, len(cases)))
+        wall = 0.0
+        for repeat in range(args.repeats):
+            rag_utils.query_embedding_cache.clear()
+            rag_utils.retrieval_cache.clear()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), \
+                    ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+                results = list(pool.map(retrieve, cases))
+            wall += time.perf_counter() - start
+            latencies[repeat] = [elapsed for _, elapsed in results]
+
+        mode_rows = []
+        for case, (ids, _), query_latencies in zip(cases, results, latencies.T):
+            mode_rows.append({
+                "mode": mode,
+                "query": case["query"],
+                **score_ranking(ids, case["relevance"], args.k),
+                "latency_ms": float(np.median(query_latencies) * 1000),
+                "retrieved_ids": " ".join(ids),
+                "relevant_ids": " ".join(case["relevance"]),
+            })
+        df = pd.DataFrame(mode_rows)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        summaries.append({
+            "mode": mode,
+            "queries": len(cases),
+            **{f"recall@{k}": df[f"recall@{k}"].mean() for k in args.k},
+            "mrr": df["rr"].mean(),
+            f"ndcg@{top_k}": df[f"ndcg@{top_k}"].mean(),
+            "qps": latencies.size / wall,
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+            **config,
+        })
+        rows.extend(mode_rows)
+
+    summary = pd.DataFrame(summaries)
+    metric_columns = [f"recall@{k}" for k in args.k] + ["mrr", f"ndcg@{top_k}", "qps", "p50_ms", "p95_ms", "p99_ms"]
+    print("\n📊 Retrieval benchmark:")
+    print(summary[["mode"] + metric_columns].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if args.compare:
+        print_comparison(summary, args.compare, metric_columns)
+
+    save_results(pd.DataFrame(rows), "retrieval_benchmark_results", args.bucket, timestamp)
+    save_results(summary, "retrieval_benchmark_summary", args.bucket, timestamp)
+
+
+if __name__ == "__main__":
+    main()
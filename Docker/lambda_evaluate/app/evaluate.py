@@ -1,14 +1,14 @@
 import json
 import nltk
 import pandas as pd
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from rouge_score import rouge_scorer
-from rag_utils import generate_answer, get_top_matches
+from metrics import RagScorer
+from rag_utils import generate_answer, get_top_matches, tracer, TRACE_EXPORT_PATH
 import csv
 from datetime import datetime, timezone
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 
 # Load environment variables
@@ -17,63 +17,75 @@ S3_BUCKET_NAME = ''
 MODEL_USED = 'gpt-4'
 use_fallback = True
 timestamp = datetime.now(timezone.utc)
+EVAL_CONCURRENCY = int(os.environ.get("EVAL_CONCURRENCY", "4"))
+EVAL_MAX_RPM = float(os.environ.get("EVAL_MAX_RPM", "200"))  # GPT-4 requests per minute across workers
+
+class RateLimiter:
+    """Token bucket shared by evaluation workers so bursts stay under the API rate limit"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+# Built once: frozen stopwords plus cached ROUGE/BLEU scorers shared by all workers
+scorer = RagScorer()
 
 def keyword_match_score(reference: str, generated: str) -> float:
-    stop_words = set(stopwords.words("english"))
-    ref_tokens = word_tokenize(reference.lower())
-    gen_tokens = word_tokenize(generated.lower())
+    return scorer.keyword_match(reference, scorer.alnum_tokens(generated))
 
-    ref_keywords = {w for w in ref_tokens if w.isalnum() and w not in stop_words}
-    gen_keywords = {w for w in gen_tokens if w.isalnum()}
+def evaluate(query, reference, use_fallback, rate_limiter=None):
+    with tracer.trace("evaluate", query=query[:80]) as trace:
+        result = _evaluate(query, reference, use_fallback, rate_limiter)
+    result["latency_ms"] = trace["duration_ms"]
+    return result
 
-    if not ref_keywords:
-        return 0.0
-
-    match_count = len(ref_keywords.intersection(gen_keywords))
-    return match_count / len(ref_keywords)
-
-def evaluate(query, reference, use_fallback):
-    matches, orig_scores, reranked_scores = get_top_matches(query, rerank=False)
+def _evaluate(query, reference, use_fallback, rate_limiter=None):
+    matches, orig_scores, reranked_scores, urls = get_top_matches(query, rerank=False, return_urls=True)
 
     # If no context, fallback to model-only
     if use_fallback and (not matches or all(len(chunk.strip()) < 30 for chunk in matches)):
-        chunks = []
+        chunks, urls = [], []
         print("⚠️ Context too weak — using GPT fallback only")
     else:
         chunks = matches
 
-    generated = generate_answer(query, chunks)
+    if rate_limiter is not None:
+        with tracer.span("rate_limit_wait"):
+            rate_limiter.acquire()
+    # Same prompt as the app: chunks grouped under their source url
+    generated = generate_answer(query, chunks, urls=urls)
 
-    print("Query:", query)
-    print("Top Chunks:")
+    # Printed as one block so output from concurrent workers does not interleave
+    log_lines = [f"Query: {query}", "Top Chunks:"]
     for i, chunk in enumerate(matches):
-        print(f"Chunk {i+1}:", chunk[:150], "...")
-    print("-" * 40)
-
-    # Compute chunk overlap
-    overlap_score, overlap_label = compute_chunk_overlap_score_with_label(generated, chunks)
-
-    # ROUGE
-    rouge = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True)
-    rouge_scores = rouge.score(reference, generated)
-
-    # BLEU
-    smoothie = SmoothingFunction().method4
-    bleu = sentence_bleu([reference.split()], generated.split(), smoothing_function=smoothie)
+        log_lines.append(f"Chunk {i+1}: {chunk[:150]} ...")
+    log_lines.append("-" * 40)
+    print("\n".join(log_lines))
 
-    # Keyword Match
-    keyword_score = keyword_match_score(reference, generated)
+    metrics = scorer.score(reference, generated, chunks)
 
     return {
         "query": query,
         "reference": reference,
         "generated": generated,
-        "rouge1": round(rouge_scores['rouge1'].fmeasure, 4),
-        "rougeL": round(rouge_scores['rougeL'].fmeasure, 4),
-        "bleu": round(bleu, 4),
-        "keyword_match": round(keyword_score, 4),
-        "chunk_overlap_score": round(overlap_score, 4),
-        "chunk_overlap_label": overlap_label,
+        **metrics,
         "fallback_used": len(chunks) == 0,
         "model": MODEL_USED,
         "index": INDEX_NAME,
@@ -81,30 +93,39 @@ def evaluate(query, reference, use_fallback):
     }
 
 def compute_chunk_overlap_score_with_label(generated_answer: str, context_chunks: list) -> tuple:
-    context_text = " ".join(context_chunks).lower()
-    
-    # Tokenize and clean answer
-    answer_tokens = word_tokenize(generated_answer.lower())
-    answer_tokens = [w for w in answer_tokens if w.isalnum()]
-    answer_tokens = [w for w in answer_tokens if w not in stopwords.words("english")]
-
-    if not answer_tokens:
-        return 0.0, "no_meaningful_tokens"
-
-    match_count = sum(1 for word in answer_tokens if word in context_text)
-    overlap_score = match_count / len(answer_tokens)
-
-    # Assign interpretation label
-    if overlap_score > 0.7:
-        label = "used_context_strongly"
-    elif overlap_score > 0.4:
-        label = "used_context_partially"
-    elif overlap_score > 0.1:
-        label = "used_context_weakly"
-    else:
-        label = "ignored_context_likely"
-
-    return overlap_score, label
+    return scorer.chunk_overlap(scorer.alnum_tokens(generated_answer), scorer.context_index(context_chunks))
+
+def run_evaluations(test_cases, concurrency=EVAL_CONCURRENCY, max_rpm=EVAL_MAX_RPM):
+    """Evaluate test cases on a bounded worker pool; results keep the input order"""
+    rate_limiter = RateLimiter(max_rpm, burst=concurrency)
+    completed = 0
+    progress_lock = threading.Lock()
+
+    def run_one(test):
+        nonlocal completed
+        result = evaluate(test["query"], test["expected_answer"], use_fallback, rate_limiter)
+        with progress_lock:
+            completed += 1
+            print(f"[{completed}/{len(test_cases)}] evaluated: {test['query'][:80]}")
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(run_one, test_cases))
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(results)} queries in {elapsed:.1f}s with {concurrency} workers "
+          f"({len(results) / max(elapsed, 1e-9):.2f} queries/s)")
+    print_stage_latencies()
+    return results
+
+def print_stage_latencies():
+    """Per-stage p50/p95/p99 and event counters collected by rag_utils.tracer"""
+    print(f"{'stage':<20} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, row in sorted(tracer.percentiles().items(), key=lambda item: -item[1]["p50_ms"]):
+        print(f"{stage:<20} {row['count']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    counters = dict(tracer.counters)
+    if counters:
+        print("Counters: " + ", ".join(f"{name}={value}" for name, value in sorted(counters.items())))
 
 def main():
     # Load test queries (adjust path for regular container)
@@ -113,13 +134,7 @@ def main():
     with open(test_queries_path, "r") as f:
         test_cases = json.load(f)
 
-    results = []
-
-    for test in test_cases:
-        query = test["query"]
-        reference = test["expected_answer"]
-        result = evaluate(query, reference, use_fallback)
-        results.append(result)
+    results = run_evaluations(test_cases)
 
     df = pd.DataFrame(results)
 
@@ -144,6 +159,8 @@ def main():
     # Generate unique filename with timestamp
     timestamp_str = timestamp.strftime("%Y%m%d_%H%M%S")
     s3_key = f"{s3_prefix}rag_evaluation_results_{timestamp_str}.csv"
+    if TRACE_EXPORT_PATH:
+        tracer.export(TRACE_EXPORT_PATH)
 
     try:
         # Upload to S3
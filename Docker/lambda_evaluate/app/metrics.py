@@ -0,0 +1,75 @@
+import pandas as pd
+from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from rouge_score import rouge_scorer
+
+
+def overlap_label(overlap_score: float) -> str:
+    """Interpretation label for a chunk overlap score"""
+    if overlap_score > 0.7:
+        return "used_context_strongly"
+    elif overlap_score > 0.4:
+        return "used_context_partially"
+    elif overlap_score > 0.1:
+        return "used_context_weakly"
+    return "ignored_context_likely"
+
+
+class RagScorer:
+    """Reusable scorer for generated answers.
+
+    Stopwords, the ROUGE scorer and the BLEU smoothing function are built once;
+    each answer is tokenized once and shared by every metric, and context
+    chunks are indexed as a token set so overlap is a hash lookup per token.
+    """
+
+    def __init__(self, language: str = "english"):
+        self.stop_words = frozenset(stopwords.words(language))
+        self.rouge = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True)
+        self.smoothing = SmoothingFunction().method4
+
+    def alnum_tokens(self, text: str) -> list:
+        return [w for w in word_tokenize(text.lower()) if w.isalnum()]
+
+    def context_index(self, context_chunks: list) -> frozenset:
+        """Token set of the retrieved context, built once per query"""
+        return frozenset(self.alnum_tokens(" ".join(context_chunks)))
+
+    def keyword_match(self, reference: str, generated_tokens: list) -> float:
+        ref_keywords = {w for w in self.alnum_tokens(reference) if w not in self.stop_words}
+        if not ref_keywords:
+            return 0.0
+        return len(ref_keywords.intersection(generated_tokens)) / len(ref_keywords)
+
+    def chunk_overlap(self, generated_tokens: list, context_tokens: frozenset) -> tuple:
+        answer_tokens = [w for w in generated_tokens if w not in self.stop_words]
+        if not answer_tokens:
+            return 0.0, "no_meaningful_tokens"
+        overlap_score = sum(1 for w in answer_tokens if w in context_tokens) / len(answer_tokens)
+        return overlap_score, overlap_label(overlap_score)
+
+    def score(self, reference: str, generated: str, context_chunks: list) -> dict:
+        """All evaluation metrics for one generated answer"""
+        generated_tokens = self.alnum_tokens(generated)
+        overlap_score, label = self.chunk_overlap(generated_tokens, self.context_index(context_chunks))
+        rouge_scores = self.rouge.score(reference, generated)
+        bleu = sentence_bleu([reference.split()], generated.split(), smoothing_function=self.smoothing)
+        return {
+            "rouge1": round(rouge_scores['rouge1'].fmeasure, 4),
+            "rougeL": round(rouge_scores['rougeL'].fmeasure, 4),
+            "bleu": round(bleu, 4),
+            "keyword_match": round(self.keyword_match(reference, generated_tokens), 4),
+            "chunk_overlap_score": round(overlap_score, 4),
+            "chunk_overlap_label": label,
+        }
+
+    def score_frame(self, df: pd.DataFrame, reference_col: str = "reference",
+                    generated_col: str = "generated", chunks_col: str = "chunks") -> pd.DataFrame:
+        """Score every row of a results DataFrame; returns it with the metric columns filled in"""
+        scores = [
+            self.score(ref, gen, chunks if isinstance(chunks, list) else [])
+            for ref, gen, chunks in zip(df[reference_col], df[generated_col], df[chunks_col])
+        ]
+        metrics = pd.DataFrame(scores, index=df.index)
+        return df.drop(columns=[c for c in metrics.columns if c in df.columns]).join(metrics)
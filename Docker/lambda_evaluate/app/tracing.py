@@ -0,0 +1,194 @@
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import boto3
+import numpy as np
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional: spans are only mirrored to OpenTelemetry when it is installed
+    otel_trace = None
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Tracer:
+    """Stage latency spans, event counters and p50/p95/p99 for the query path.
+
+    A trace groups the spans of one request (a Streamlit query or one evaluated
+    test case). The current trace and span depth are thread-local, because
+    Streamlit runs each session on its own thread and the evaluator runs each
+    query on a worker; spans on other threads (e.g. the pointwise rerank pool)
+    still feed the histograms and global counters. Each stage keeps its last
+    `window` durations, so percentiles follow recent traffic in flat memory,
+    plus cumulative count/sum for the Prometheus summary.
+    """
+
+    def __init__(self, window=2048, keep_traces=50, otel=False):
+        self.window = window
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.samples = {}   # stage -> deque of seconds
+        self.totals = {}    # stage -> [count, seconds]
+        self.counters = {}
+        self.traces = deque(maxlen=keep_traces)
+        self.otel = otel_trace.get_tracer("rag") if otel and otel_trace is not None else None
+        if otel and otel_trace is None:
+            print("[WARN] TRACE_OTEL is set but opentelemetry is not installed; spans stay local")
+
+    # ---------------------- recording ----------------------
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+                self.totals[stage] = [0, 0.0]
+            self.samples[stage].append(seconds)
+            self.totals[stage][0] += 1
+            self.totals[stage][1] += seconds
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        trace = getattr(self.local, "trace", None)
+        if trace is not None:
+            trace["counters"][name] = trace["counters"].get(name, 0) + n
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Time the block as stage `name`; yields attrs so the block can add to them."""
+        local = self.local
+        depth = getattr(local, "depth", 0)
+        local.depth = depth + 1
+        trace = getattr(local, "trace", None)
+        start = time.perf_counter()
+        otel_span = self.otel.start_as_current_span(name) if self.otel is not None else None
+        try:
+            if otel_span is None:
+                yield attrs
+            else:
+                with otel_span as current:
+                    yield attrs
+                    current.set_attributes({k: v for k, v in attrs.items()
+                                            if isinstance(v, (str, bool, int, float))})
+        except Exception as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            local.depth = depth
+            self.observe(name, elapsed)
+            if trace is not None:
+                trace["spans"].append({
+                    "name": name,
+                    "depth": depth,
+                    "offset_ms": round((start - trace["_start"]) * 1000, 3),
+                    "duration_ms": round(elapsed * 1000, 3),
+                    **attrs,
+                })
+
+    @contextmanager
+    def trace(self, name, **attrs):
+        """Collect the spans and counters inside into one trace, kept in self.traces.
+
+        Yields the trace dict; spans are ordered by start time once the block exits.
+        """
+        record = {"name": name, "started_at": time.time(), "_start": time.perf_counter(),
+                  "spans": [], "counters": {}, **attrs}
+        parent = getattr(self.local, "trace", None)
+        self.local.trace = record
+        try:
+            with self.span(name):
+                yield record
+        finally:
+            self.local.trace = parent
+            record["duration_ms"] = round((time.perf_counter() - record.pop("_start")) * 1000, 3)
+            record["spans"].sort(key=lambda s: s["offset_ms"])
+            with self.lock:
+                self.traces.append(record)
+
+    def current_trace(self):
+        return getattr(self.local, "trace", None)
+
+    # ---------------------- reporting ----------------------
+
+    def percentiles(self):
+        """{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} over each stage's recent window"""
+        with self.lock:
+            samples = {stage: np.array(values) for stage, values in self.samples.items()}
+            totals = {stage: list(total) for stage, total in self.totals.items()}
+        summary = {}
+        for stage, values in samples.items():
+            row = {"count": totals[stage][0], "mean_ms": float(values.mean() * 1000)}
+            for q, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                row[f"p{round(q * 100)}_ms"] = float(value * 1000)
+            summary[stage] = row
+        return summary
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            traces = list(self.traces)
+        return {"generated_at": time.time(), "stages": self.percentiles(), "counters": counters, "traces": traces}
+
+    def prometheus_text(self, prefix="rag"):
+        """Prometheus text exposition: a latency summary per stage and one counter per event"""
+        summary = self.percentiles()
+        with self.lock:
+            totals = {stage: list(total) for stage, total in self.totals.items()}
+            counters = dict(self.counters)
+        lines = [f"# HELP {prefix}_stage_latency_seconds Query path stage latency",
+                 f"# TYPE {prefix}_stage_latency_seconds summary"]
+        for stage, row in sorted(summary.items()):
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} '
+                             f'{row[f"p{round(q * 100)}_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {totals[stage][1]:.6f}')
+            lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {totals[stage][0]}')
+        lines += [f"# HELP {prefix}_events_total Cache hits/misses, retries and errors",
+                  f"# TYPE {prefix}_events_total counter"]
+        for name, value in sorted(counters.items()):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path, region_name="us-east-1"):
+        """Write a .prom/.txt Prometheus text file, or JSON otherwise, to a local path or s3://bucket/key"""
+        if path.endswith((".prom", ".txt")):
+            body = self.prometheus_text()
+        else:
+            body = json.dumps(self.snapshot(), default=str)
+        try:
+            if path.startswith("s3://"):
+                bucket, _, key = path[len("s3://"):].partition("/")
+                s3 = boto3.client("s3", region_name=region_name)
+                s3.put_object(Bucket=bucket, Key=key, Body=body.encode("utf-8"))
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(body)
+        except Exception as e:
+            print(f"[ERROR] Failed to export traces to {path}: {e}")
+
+
+class _RetryCounter(logging.Handler):
+    """Counts the SDK's "Retrying request" log lines, one per retried OpenAI call"""
+
+    def __init__(self, tracer):
+        super().__init__(level=logging.INFO)
+        self.tracer = tracer
+
+    def emit(self, record):
+        if record.getMessage().startswith("Retrying request"):
+            self.tracer.incr("openai_retries")
+
+
+def count_openai_retries(tracer):
+    """The openai SDK retries timeouts, 429s and 5xx internally; count them as openai_retries"""
+    logger = logging.getLogger("openai._base_client")
+    if not any(isinstance(h, _RetryCounter) for h in logger.handlers):
+        if logger.getEffectiveLevel() > logging.INFO:
+            logger.setLevel(logging.INFO)
+        logger.addHandler(_RetryCounter(tracer))
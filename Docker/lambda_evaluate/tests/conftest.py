@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The evaluator modules are flat scripts copied from app/ into the image, so import them from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
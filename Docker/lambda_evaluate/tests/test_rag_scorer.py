@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from metrics import RagScorer, overlap_label
+
+
+@pytest.fixture(scope="module")
+def scorer():
+    try:
+        scorer = RagScorer()
+        scorer.alnum_tokens("punkt probe")
+        return scorer
+    except LookupError:
+        pytest.skip("nltk stopwords/punkt data not downloaded")
+
+
+REFERENCE = "Use Rivers of Blood with arcane scaling and the Lord of Blood's Exultation talisman"
+CHUNKS = ["Rivers of Blood scales with arcane", "Lord of Blood's Exultation boosts attack after bleed"]
+
+
+def test_overlap_labels():
+    assert overlap_label(0.8) == "used_context_strongly"
+    assert overlap_label(0.5) == "used_context_partially"
+    assert overlap_label(0.2) == "used_context_weakly"
+    assert overlap_label(0.0) == "ignored_context_likely"
+
+
+def test_identical_answer_scores_perfectly(scorer):
+    metrics = scorer.score(REFERENCE, REFERENCE, CHUNKS)
+    assert metrics["rouge1"] == metrics["rougeL"] == metrics["keyword_match"] == 1.0
+    assert metrics["bleu"] == pytest.approx(1.0)
+
+
+def test_keyword_match_ignores_stopwords_and_case(scorer):
+    tokens = scorer.alnum_tokens("RIVERS blood ARCANE")
+    assert scorer.keyword_match("the Rivers of Blood, with arcane", tokens) == 1.0
+    assert scorer.keyword_match("of the and", tokens) == 0.0
+
+
+def test_chunk_overlap_against_context(scorer):
+    context = scorer.context_index(CHUNKS)
+    score, label = scorer.chunk_overlap(scorer.alnum_tokens("Rivers of Blood with arcane"), context)
+    assert score == 1.0 and label == "used_context_strongly"
+    score, label = scorer.chunk_overlap(scorer.alnum_tokens("Moonveil sorcery katana"), context)
+    assert score == 0.0 and label == "ignored_context_likely"
+    assert scorer.chunk_overlap(scorer.alnum_tokens("the and of"), context) == (0.0, "no_meaningful_tokens")
+
+
+def test_score_frame_fills_metric_columns(scorer):
+    df = pd.DataFrame({"reference": [REFERENCE, REFERENCE], "generated": [REFERENCE, "Moonveil katana"],
+                       "chunks": [CHUNKS, None], "rouge1": [0.0, 0.0]})
+    scored = scorer.score_frame(df)
+    assert list(scored["rouge1"]) == [1.0, scored["rouge1"][1]] and scored["rouge1"][1] < 1.0
+    assert scored["chunk_overlap_label"][1] == "ignored_context_likely"
+    assert list(scored.columns).count("rouge1") == 1
@@ -1,23 +1,80 @@
+import time
+script_start = time.perf_counter()
 import streamlit as st
-from rag_utils import get_top_matches, generate_answer
+from rag_utils import (
+    get_top_matches,
+    generate_answer_stream,
+    get_cached_answer,
+    store_answer,
+    warm_up,
+    tracer,
+    maybe_export_traces,
+    RECENCY_WINDOW_DAYS,
+    RECENCY_HALF_LIFE_DAYS,
+)
 
 st.title("🔍 Elden Ring Build Finder")
 
+# Only the first session in a process pays for model/index loading; later reruns hit the cache
+warm_seconds = warm_up()
+print(f"App startup: {time.perf_counter() - script_start:.2f}s (warm-up {warm_seconds:.2f}s)")
+
 query = st.text_input("Ask your question:")
 
 rerank_enabled = st.checkbox("🔄 Enable reranking of retrieved chunks", value=False)
 
+window_options = [0, 30, 90, 365]
+window_days = st.sidebar.selectbox(
+    "🕒 Only use posts from",
+    window_options,
+    index=window_options.index(RECENCY_WINDOW_DAYS) if RECENCY_WINDOW_DAYS in window_options else 0,
+    format_func=lambda days: "Any time" if not days else f"Last {days} days",
+)
+favor_recent = st.sidebar.checkbox("📅 Favor recent posts", value=bool(RECENCY_HALF_LIFE_DAYS))
+half_life_days = (RECENCY_HALF_LIFE_DAYS or 180) if favor_recent else 0
+show_debug = st.sidebar.checkbox("🐞 Show latency debug panel", value=False)
+
 matches = []
 orig_scores = []
 reranked_scores = []
 
 if query:
-    with st.spinner("Fetching answer..."):
-        docs, metadata, original_scores, reranked_scores = get_top_matches(query, rerank=rerank_enabled)
-        answer = generate_answer(query, docs, metadata)
+    # One trace per answered query: every stage below records a span into it
+    with tracer.trace("query", query=query[:80]) as trace:
+        with st.spinner("Fetching context..."):
+            docs, metadata, original_scores, reranked_scores = get_top_matches(
+                query, rerank=rerank_enabled, window_days=window_days, half_life_days=half_life_days
+            )
 
         st.subheader("📖 Answer")
-        st.write(answer)
+        answer = get_cached_answer(query, docs, metadata)
+        if answer is not None:
+            st.write(answer)
+        else:
+            # Tokens render as they arrive instead of waiting on the full completion
+            answer = st.write_stream(generate_answer_stream(query, docs, metadata))
+            store_answer(query, docs, metadata, answer)
+    st.session_state["last_trace"] = trace
+    maybe_export_traces()
+    matches, orig_scores = docs, original_scores
+
+if show_debug:
+    with st.expander("🐞 Latency debug", expanded=True):
+        trace = st.session_state.get("last_trace")
+        if trace:
+            st.markdown(f"**Last query:** {trace['duration_ms']:.0f} ms")
+            st.dataframe([
+                {"stage": "· " * span["depth"] + span["name"], "start ms": span["offset_ms"],
+                 "duration ms": span["duration_ms"],
+                 "details": ", ".join(f"{k}={v}" for k, v in span.items()
+                                      if k not in ("name", "depth", "offset_ms", "duration_ms"))}
+                for span in trace["spans"]
+            ], use_container_width=True)
+            st.json(trace["counters"])
+        st.markdown("**Stage percentiles (this process)**")
+        st.dataframe([{"stage": stage, **{k: round(v, 2) for k, v in row.items()}}
+                      for stage, row in sorted(tracer.percentiles().items())], use_container_width=True)
+        st.json(dict(tracer.counters))
 
 if st.checkbox("🧩 Show retrieved chunks"):
     st.subheader("Context Chunks")
@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional: falls back to a ~4 characters per token estimate
+    tiktoken = None
+
+WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=4)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model="gpt-4"):
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+    return len(_encoding(model).encode(text))
+
+
+def truncate_tokens(text, max_tokens, model="gpt-4"):
+    if tiktoken is None:
+        return text[:max_tokens * 4]
+    encoding = _encoding(model)
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def count_message_tokens(messages, model="gpt-4"):
+    """Prompt tokens for a chat request: content plus the ~4 tokens of framing per message."""
+    return sum(count_tokens(m["content"], model) + 4 for m in messages) + 3
+
+
+def shingles(text, size=5):
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def pack_context(chunks, urls=None, budget_tokens=3000, dedup_threshold=0.8, min_chunk_tokens=64,
+                 model="gpt-4"):
+    """Pack ranked chunks (best first) into a context string of at most budget_tokens.
+
+    A chunk whose word-shingle Jaccard similarity to an already kept chunk is at
+    least dedup_threshold is dropped (exact Jaccard; at top_k sizes it is cheaper
+    than MinHash). Chunks are kept greedily in rank order, and the first one that
+    does not fit is truncated if at least min_chunk_tokens remain. Kept chunks are
+    grouped under one "Source:" line per url, with groups in order of their best chunk.
+    Returns (context, stats).
+    """
+    urls = urls or [""] * len(chunks)
+    stats = {"candidates": len(chunks), "duplicates": 0, "packed": 0, "truncated": 0, "context_tokens": 0}
+
+    kept_shingles = []
+    groups = {}
+    used = 0
+    for chunk, url in zip(chunks, urls):
+        chunk_shingles = shingles(chunk)
+        if any(jaccard(chunk_shingles, seen) >= dedup_threshold for seen in kept_shingles):
+            stats["duplicates"] += 1
+            continue
+        # Separators and the per-url "Source:" header are counted against the budget too
+        header = 0 if url in groups or not url else count_tokens(f"Source: {url}\n", model)
+        cost = count_tokens(chunk, model) + header + 2
+        if used + cost > budget_tokens:
+            remaining = budget_tokens - used - header - 2
+            if remaining < min_chunk_tokens:
+                continue
+            chunk = truncate_tokens(chunk, remaining, model)
+            cost = remaining + header + 2
+            stats["truncated"] += 1
+        kept_shingles.append(chunk_shingles)
+        groups.setdefault(url, []).append(chunk)
+        used += cost
+        stats["packed"] += 1
+
+    blocks = []
+    for url, group in groups.items():
+        body = "\n\n".join(group)
+        blocks.append(f"Source: {url}\n{body}" if url else body)
+    context = "\n\n".join(blocks)
+    stats["context_tokens"] = count_tokens(context, model) if context else 0
+    return context, stats
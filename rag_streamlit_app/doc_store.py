@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+
+class SQLiteDocStore:
+    """Vector id -> text in a single SQLite file; suited to local and offline runs."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        self.conn.commit()
+
+    def put_many(self, texts):
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO docs (id, text) VALUES (?, ?)", texts.items())
+            self.conn.commit()
+
+    def get_many(self, ids):
+        if not ids:
+            return {}
+        placeholders = ",".join("?" for _ in ids)
+        with self.lock:
+            rows = self.conn.execute(f"SELECT id, text FROM docs WHERE id IN ({placeholders})", list(ids))
+            return dict(rows.fetchall())
+
+    def delete_many(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        placeholders = ",".join("?" for _ in ids)
+        with self.lock:
+            self.conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", ids)
+            self.conn.commit()
+
+
+class S3DocStore:
+    """Vector id -> text as one S3 object per id under a prefix; fetched in parallel."""
+
+    def __init__(self, bucket, prefix, region_name="us-east-1", max_workers=16):
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/")
+        self.max_workers = max_workers
+        self.s3 = boto3.client("s3", region_name=region_name)
+
+    def _key(self, vector_id):
+        return f"{self.prefix}/{vector_id}.txt"
+
+    def _put(self, item):
+        vector_id, text = item
+        self.s3.put_object(Bucket=self.bucket, Key=self._key(vector_id), Body=text.encode("utf-8"),
+                           ContentType="text/plain; charset=utf-8")
+
+    def _get(self, vector_id):
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=self._key(vector_id))["Body"].read()
+            return vector_id, body.decode("utf-8")
+        except self.s3.exceptions.NoSuchKey:
+            return vector_id, None
+
+    def put_many(self, texts):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(self._put, texts.items()))
+
+    def get_many(self, ids):
+        if not ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(ids))) as pool:
+            return {vid: text for vid, text in pool.map(self._get, ids) if text is not None}
+
+    def delete_many(self, ids):
+        keys = [{"Key": self._key(vid)} for vid in ids]
+        # delete_objects takes at most 1000 keys per request
+        for i in range(0, len(keys), 1000):
+            self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": keys[i:i + 1000], "Quiet": True})
+
+
+def open_doc_store(uri, region_name="us-east-1"):
+    """s3://bucket/prefix -> S3DocStore; anything else is a SQLite file path."""
+    if uri.startswith("s3://"):
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return S3DocStore(bucket, prefix or "docs", region_name=region_name)
+    return SQLiteDocStore(uri)
@@ -0,0 +1,134 @@
+"""Local stand-in for the OpenAI chat completions endpoint, for benchmarks and offline runs.
+
+    python mock_openai.py --port 8001 --latency-ms 800
+    export OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "The Venomous Fang is a claw weapon that builds up poison quickly. Pair it with a "
+    "Poison or Occult affinity and talismans that boost status buildup for a strong build."
+)
+
+
+def mock_reply(prompt):
+    """Deterministic content shaped like what each of our prompts expects back.
+
+    Scores are drawn from a generator seeded with the prompt, so the same prompt
+    always gets the same reply across calls, threads and runs.
+    """
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+    if "Passages:" in prompt:
+        n = len(re.findall(r"^\[\d+\] ", prompt, re.M))
+        return json.dumps([round(rng.uniform(0, 10), 1) for _ in range(n)])
+    if "How relevant is this passage" in prompt:
+        return str(rng.randint(0, 10))
+    return ANSWER
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    latency_s = 0.5
+    jitter_s = 0.0
+    token_interval_s = 0.02
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency_s + random.uniform(0, self.jitter_s))
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        content = mock_reply(prompt)
+        if body.get("stream"):
+            self.stream_reply(body, content)
+            return
+        payload = {
+            "id": f"chatcmpl-mock-{random.randint(0, 1 << 30)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt.split()),
+                "completion_tokens": len(content.split()),
+                "total_tokens": len(prompt.split()) + len(content.split()),
+            },
+        }
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream_reply(self, body, content):
+        """Server-sent events in the chat.completion.chunk format, one word per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        base = {
+            "id": f"chatcmpl-mock-{random.randint(0, 1 << 30)}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4"),
+        }
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.token_interval_s)
+        done = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def start_mock_openai(latency_s=0.5, jitter_s=0.0, port=0, token_interval_s=0.02):
+    """Serve the mock on a background thread; returns (server, base_url).
+
+    latency_s is the time to the first token; streamed replies then emit one
+    word every token_interval_s.
+    """
+    handler = type("Handler", (MockOpenAIHandler,), {
+        "latency_s": latency_s, "jitter_s": jitter_s, "token_interval_s": token_interval_s
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--token-interval-ms", type=float, default=20)
+    args = parser.parse_args()
+    server, base_url = start_mock_openai(args.latency_ms / 1000, args.jitter_ms / 1000, args.port,
+                                         args.token_interval_ms / 1000)
+    print(f"[INFO] Mock OpenAI listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,145 @@
+"""ONNX Runtime embedding backend (float32 or dynamic int8) for CPU-only inference.
+
+Export once ahead of the image build so containers do not pay for it at startup:
+
+    python onnx_encoder.py all-mpnet-base-v2 --cache-folder ./cache
+"""
+import os
+import json
+
+import numpy as np
+
+# EMBEDDING_BACKEND values accepted by load_encoder
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _onnx_dir(model_name, cache_folder):
+    return os.path.join(cache_folder or ".", "onnx", model_name.replace("/", "__"))
+
+
+def export_onnx(model_name, out_dir, cache_folder=None):
+    """Export a SentenceTransformer's transformer to ONNX plus a dynamically int8-quantized copy.
+
+    Pooling (mean over the attention mask) and normalization are re-applied in
+    numpy by OnnxSentenceEncoder, so only the transformer itself is exported.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    st_model = SentenceTransformer(model_name, cache_folder=cache_folder)
+    pooling = next(m for m in st_model.modules() if isinstance(m, Pooling))
+    if not pooling.pooling_mode_mean_tokens:
+        raise ValueError(f"{model_name} does not use mean pooling; ONNX export supports mean pooling only")
+
+    os.makedirs(out_dir, exist_ok=True)
+    transformer = st_model[0].auto_model.eval()
+    transformer.config.return_dict = False
+    dummy = st_model.tokenizer(["export the model"], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+    quantize_dynamic(fp32_path, os.path.join(out_dir, "model-int8.onnx"), weight_type=QuantType.QInt8)
+
+    st_model.tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "encoder_config.json"), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": st_model.max_seq_length,
+            "normalize": any(isinstance(m, Normalize) for m in st_model.modules()),
+        }, f)
+    print(f"[INFO] Exported {model_name} to ONNX (fp32 + int8) in {out_dir}")
+
+
+class OnnxSentenceEncoder:
+    """ONNX Runtime stand-in for SentenceTransformer.encode on CPU.
+
+    Exposes encode(), tokenizer and max_seq_length, which is all the embedder
+    and rag_utils use from a SentenceTransformer.
+    """
+
+    def __init__(self, model_dir, quantized=True, num_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "encoder_config.json")) as f:
+            config = json.load(f)
+        self.max_seq_length = config["max_seq_length"]
+        self.normalize = config["normalize"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = "model-int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            mask = batch["attention_mask"].astype(np.int64)
+            hidden = self.session.run(None, {
+                "input_ids": batch["input_ids"].astype(np.int64),
+                "attention_mask": mask,
+            })[0]
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+        embeddings = np.vstack(outputs) if outputs else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def load_encoder(model_name, backend="torch", cache_folder=None, num_threads=None):
+    """Return a SentenceTransformer (torch) or an OnnxSentenceEncoder, exporting ONNX on first use."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected one of {BACKENDS}")
+
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return SentenceTransformer(model_name, cache_folder=cache_folder)
+
+    model_dir = _onnx_dir(model_name, cache_folder)
+    if not os.path.exists(os.path.join(model_dir, "encoder_config.json")):
+        export_onnx(model_name, model_dir, cache_folder=cache_folder)
+    return OnnxSentenceEncoder(model_dir, quantized=backend == "onnx-int8", num_threads=num_threads)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model_name")
+    parser.add_argument("--cache-folder", default="./cache")
+    args = parser.parse_args()
+    export_onnx(args.model_name, _onnx_dir(args.model_name, args.cache_folder), cache_folder=args.cache_folder)
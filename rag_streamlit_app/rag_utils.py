@@ -1,76 +1,491 @@
+import time
+_import_start = time.perf_counter()
 import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
-from pinecone import Pinecone
+import streamlit as st
+from vector_store import LocalVectorStore, matches_filter
+from query_cache import LRUCache
+from doc_store import open_doc_store
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from semantic_cache import SemanticAnswerCache
+from context_packing import pack_context, count_message_tokens
+from tracing import Tracer, count_openai_retries
 from datetime import datetime
+import numpy as np
 
 # Load environment variables
 load_dotenv()
 
-# Setup clients
-#s3_client = boto3.client('s3')  # (optional, not used in this code)
-embedding_model = SentenceTransformer("all-mpnet-base-v2")
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"), environment="us-east1-aws")
-index = pc.Index("lands-between-eldenringbuilds")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-mpnet-base-v2")
+# torch | onnx | onnx-int8; must match the backend gen_embeddings used to build the index
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+# LLM reranking: concurrent pointwise calls, or one listwise call scoring every passage
+RERANK_CONCURRENCY = int(os.environ.get("RERANK_CONCURRENCY", "8"))
+RERANK_TIMEOUT = float(os.environ.get("RERANK_TIMEOUT", "30"))
+RERANK_MAX_RETRIES = int(os.environ.get("RERANK_MAX_RETRIES", "2"))
+# Rerank method: "cosine" rescores stored vectors, "cross-encoder" runs a batched cross-encoder
+RERANK_METHOD = os.environ.get("RERANK_METHOD", "cosine")
+CROSS_ENCODER_MODEL = os.environ.get("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
 
+# Where full_text lives when gen_embeddings ran with DOC_STORE_URI (sqlite path or s3://bucket/prefix)
+DOC_STORE_URI = os.environ.get("DOC_STORE_URI", "")
 
-def rerank_documents(query: str, documents: list, client):
-    reranked = []
-    for doc in documents:
-        # Simple prompt for reranking
-        prompt = f"Query: {query}\n\nPassage: {doc}\n\nHow relevant is this passage to the query? Respond with a score from 0 (not relevant) to 10 (highly relevant)."
-        response = client.chat.completions.create(
+# Query embeddings are deterministic, so they only need LRU bounds; retrieval
+# results expire so a refreshed index is picked up
+query_embedding_cache = LRUCache(
+    max_size=int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+)
+retrieval_cache = LRUCache(
+    max_size=int(os.environ.get("QUERY_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.environ.get("RETRIEVAL_CACHE_TTL", "300"))
+)
+
+# Hybrid retrieval: BM25 postings written by gen_embeddings (local .npz path or s3://bucket/key),
+# fused with dense results by reciprocal rank fusion
+BM25_INDEX_PATH = os.environ.get("BM25_INDEX_PATH", "")
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid" if BM25_INDEX_PATH else "dense")  # dense | hybrid
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.environ.get("RRF_K", "60"))
+# Recency: keep only posts inside a time window (filtered in the index) and/or decay scores by post age
+RECENCY_WINDOW_DAYS = float(os.environ.get("RECENCY_WINDOW_DAYS", "0"))  # 0 = no window
+RECENCY_HALF_LIFE_DAYS = float(os.environ.get("RECENCY_HALF_LIFE_DAYS", "0"))  # 0 = no decay
+RECENCY_OVERFETCH = int(os.environ.get("RECENCY_OVERFETCH", "3"))
+RECENCY_MAX_FETCH = int(os.environ.get("RECENCY_MAX_FETCH", "100"))
+# Prompt context: token budget for packed chunks and the shingle-Jaccard threshold for near-duplicates
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# Semantic answer cache: reuse an answer for a near-identical query with the same retrieved context
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Stage latency tracing: spans and counters per query, exported every TRACE_EXPORT_INTERVAL seconds
+# to TRACE_EXPORT_PATH (.json, or .prom for Prometheus text; local path or s3://bucket/key).
+# TRACE_OTEL=1 also mirrors spans to OpenTelemetry when it is installed and configured.
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "")
+TRACE_EXPORT_INTERVAL = float(os.environ.get("TRACE_EXPORT_INTERVAL", "60"))
+tracer = Tracer(otel=os.environ.get("TRACE_OTEL", "0") == "1")
+count_openai_retries(tracer)
+_last_trace_export = time.monotonic()
+
+# How often to ask the index whether gen_embeddings has refreshed it
+index_version_cache = LRUCache(max_size=1, ttl_seconds=float(os.environ.get("INDEX_VERSION_TTL", "60")))
+
+INDEX_NAME = "lands-between-eldenringbuilds"
+# "local" reads the memory-mapped index written by gen_embeddings instead of calling Pinecone
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "pinecone")
+
+
+# Setup clients. st.cache_resource keeps one instance per process across script
+# reruns and hot reloads; heavy libraries are only imported on first use.
+@st.cache_resource(show_spinner="Loading embedding model...")
+def get_embedding_model():
+    start = time.perf_counter()
+    from onnx_encoder import load_encoder
+    model = load_encoder(
+        EMBEDDING_MODEL,
+        backend=EMBEDDING_BACKEND,
+        cache_folder=os.environ.get("EMBEDDING_CACHE_DIR"),
+        num_threads=EMBEDDING_THREADS or None
+    )
+    print(f"Loaded embedding model ({EMBEDDING_BACKEND}) in {time.perf_counter() - start:.2f}s")
+    return model
+
+
+@st.cache_resource
+def get_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+
+
+@st.cache_resource
+def get_index():
+    start = time.perf_counter()
+    if VECTOR_STORE == "local":
+        index = LocalVectorStore(os.environ.get("LOCAL_INDEX_DIR", "local_index"))
+    else:
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"), environment="us-east1-aws")
+        index = pc.Index(INDEX_NAME)
+    print(f"Connected to {VECTOR_STORE} index in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+@st.cache_resource
+def get_doc_store():
+    return open_doc_store(DOC_STORE_URI)
+
+
+@st.cache_resource(show_spinner="Loading BM25 index...")
+def get_bm25_index():
+    return BM25Index(BM25_INDEX_PATH).load()
+
+
+@st.cache_resource
+def get_answer_cache():
+    return SemanticAnswerCache(max_size=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD)
+
+
+def current_index_version():
+    """Vector count of the index, which changes whenever gen_embeddings adds vectors.
+
+    Re-upserting an edited post under its old ids leaves the count unchanged;
+    the answer cache catches that by also comparing the retrieved texts.
+    """
+    version = index_version_cache.get("version")
+    if version is None:
+        try:
+            version = get_index().describe_index_stats()["total_vector_count"]
+        except Exception as e:
+            print(f"Error reading index stats: {e}")
+            return None
+        index_version_cache.put("version", version)
+    return version
+
+
+def get_cached_answer(query: str, docs: list, metadata: list):
+    """Answer previously generated for a near-identical query over the same documents, if any"""
+    with tracer.span("answer_cache") as span:
+        answer_cache = get_answer_cache()
+        answer_cache.sync_index_version(current_index_version())
+        answer = answer_cache.get(embed_query(query), [m.get("id") for m in metadata], docs)
+        span["hit"] = answer is not None
+    tracer.incr("answer_cache_hit" if answer is not None else "answer_cache_miss")
+    return answer
+
+
+def store_answer(query: str, docs: list, metadata: list, answer: str):
+    if answer and not answer.startswith("Error generating answer"):
+        get_answer_cache().put(embed_query(query), [m.get("id") for m in metadata], docs, answer)
+
+
+def warm_up():
+    """Load the model, clients and index up front; returns seconds spent (near zero once cached)"""
+    start = time.perf_counter()
+    get_embedding_model()
+    get_openai_client()
+    get_index()
+    if RETRIEVAL_MODE == "hybrid":
+        get_bm25_index()
+    return time.perf_counter() - start
+
+
+def _score_passage(llm, query: str, doc: str) -> float:
+    """Pointwise GPT-4 relevance score for one passage, 0.0 on failure"""
+    # Simple prompt for reranking
+    prompt = f"Query: {query}\n\nPassage: {doc}\n\nHow relevant is this passage to the query? Respond with a score from 0 (not relevant) to 10 (highly relevant)."
+    try:
+        response = llm.chat.completions.create(
             model="gpt-4",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.0
         )
         score_text = response.choices[0].message.content.strip()
         try:
-            score = float(score_text)
+            return float(score_text)
         except ValueError:
-            score = 0.0
-        reranked.append((doc, score))
-    
+            return 0.0
+    except Exception as e:
+        print(f"Error in reranking: {e}")
+        tracer.incr("rerank_errors")
+        return 0.0
+
+
+def _score_listwise(llm, query: str, documents: list) -> list:
+    """Score every passage with a single GPT-4 call"""
+    passages = "\n\n".join(f"[{i}] {doc}" for i, doc in enumerate(documents, 1))
+    prompt = (
+        f"Query: {query}\n\nPassages:\n{passages}\n\n"
+        f"Rate how relevant each passage is to the query from 0 (not relevant) to 10 (highly relevant). "
+        f"Respond with only a JSON array of {len(documents)} numbers, one per passage, in order."
+    )
+    try:
+        response = llm.chat.completions.create(
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0
+        )
+        score_text = response.choices[0].message.content
+        scores = [float(s) for s in json.loads(re.search(r"\[.*\]", score_text, re.S).group(0))]
+        if len(scores) != len(documents):
+            raise ValueError(f"expected {len(documents)} scores, got {len(scores)}")
+        return scores
+    except Exception as e:
+        print(f"Error in listwise reranking: {e}")
+        tracer.incr("rerank_errors")
+        return [0.0] * len(documents)
+
+
+def rerank_documents(query: str, documents: list, client, mode: str = "pointwise",
+                     max_workers: int = RERANK_CONCURRENCY):
+    """Rerank documents using GPT-4 relevance scoring, concurrently or in one listwise call"""
+    # The SDK retries timeouts, 429s and 5xx with backoff
+    llm = client.with_options(timeout=RERANK_TIMEOUT, max_retries=RERANK_MAX_RETRIES)
+    if not documents:
+        return [], []
+
+    with tracer.span("llm_rerank", mode=mode, passages=len(documents)):
+        if mode == "listwise":
+            scores = _score_listwise(llm, query, documents)
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(documents)))) as pool:
+                scores = list(pool.map(lambda doc: _score_passage(llm, query, doc), documents))
+
     # Sort by score descending
-    reranked.sort(key=lambda x: x[1], reverse=True)
+    reranked = sorted(zip(documents, scores), key=lambda x: x[1], reverse=True)
     reranked_docs, reranked_scores = zip(*reranked)
     return list(reranked_docs), list(reranked_scores)
 
 
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as the cache key"""
+    return " ".join(query.lower().split())
+
+
+def embed_query(query: str):
+    """Encode a query, reusing the embedding for repeated queries"""
+    key = normalize_query(query)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        tracer.incr("query_embedding_cache_miss")
+        with tracer.span("embed_query", backend=EMBEDDING_BACKEND):
+            embedding = get_embedding_model().encode(query.strip()).tolist()
+        query_embedding_cache.put(key, embedding)
+    else:
+        tracer.incr("query_embedding_cache_hit")
+    return embedding
+
+
+def maybe_export_traces(force: bool = False):
+    """Write the tracer's metrics to TRACE_EXPORT_PATH at most every TRACE_EXPORT_INTERVAL seconds"""
+    global _last_trace_export
+    if not TRACE_EXPORT_PATH:
+        return
+    now = time.monotonic()
+    if force or now - _last_trace_export >= TRACE_EXPORT_INTERVAL:
+        _last_trace_export = now
+        tracer.export(TRACE_EXPORT_PATH)
+
+
+def cache_stats():
+    """Hit/miss counters for the query embedding, retrieval and answer caches"""
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "answer": get_answer_cache().stats(),
+    }
 
-def get_top_matches(query: str, top_k: int = 5, rerank: bool = False):
+
+def get_top_matches(query: str, top_k: int = 5, rerank: bool = False,
+                    window_days: float = None, half_life_days: float = None):
+    """Retrieve top matching documents, serving repeated queries from the retrieval cache.
+
+    window_days / half_life_days default to RECENCY_WINDOW_DAYS / RECENCY_HALF_LIFE_DAYS; 0 disables.
+    """
+    window_days = RECENCY_WINDOW_DAYS if window_days is None else window_days
+    half_life_days = RECENCY_HALF_LIFE_DAYS if half_life_days is None else half_life_days
+    key = (normalize_query(query), top_k, rerank, window_days, half_life_days, INDEX_NAME)
+    with tracer.span("retrieve", top_k=top_k, rerank=rerank, mode=RETRIEVAL_MODE) as span:
+        result = retrieval_cache.get(key)
+        span["cache_hit"] = result is not None
+        if result is None:
+            tracer.incr("retrieval_cache_miss")
+            result = _retrieve_top_matches(query, top_k, rerank, window_days, half_life_days)
+            # Empty results are also what errors return, so they are never cached
+            if result[0]:
+                retrieval_cache.put(key, result)
+        else:
+            tracer.incr("retrieval_cache_hit")
+        span["documents"] = len(result[0])
+    return tuple(list(part) for part in result)
+
+
+@st.cache_resource(show_spinner="Loading cross-encoder...")
+def get_cross_encoder():
+    """Load the cross-encoder reranker on first use"""
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(CROSS_ENCODER_MODEL)
+
+
+def rerank_scores(query: str, query_embedding: list, docs: list, doc_values: list):
+    """Score all candidates at once: a batched cross-encoder pass, or cosine against stored vectors"""
+    with tracer.span("rerank", method=RERANK_METHOD, candidates=len(docs)):
+        return _rerank_scores(query, query_embedding, docs, doc_values)
+
+
+def _rerank_scores(query: str, query_embedding: list, docs: list, doc_values: list):
+    if RERANK_METHOD == "cross-encoder":
+        scores = get_cross_encoder().predict([(query, doc) for doc in docs], batch_size=len(docs))
+        return [float(s) for s in scores]
+
+    # Pinecone already holds the document vectors; only encode (in one batch) if they were not returned
+    if all(doc_values):
+        doc_matrix = np.asarray(doc_values, dtype=np.float32)
+    else:
+        doc_matrix = get_embedding_model().encode(docs, batch_size=len(docs))
+    q = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(doc_matrix, axis=1) * np.linalg.norm(q)
+    scores = (doc_matrix @ q) / np.where(norms == 0, 1.0, norms)
+    return scores.tolist()
+
+
+def match_texts(matches):
+    """Text for each match: inline metadata, else batch-fetched from the document store"""
+    texts = [
+        match['metadata'].get('full_text', '') or
+        match['metadata'].get('text', '') or
+        match['metadata'].get('content', '')
+        for match in matches
+    ]
+    missing = [match['id'] for match, text in zip(matches, texts) if not text]
+    if missing and DOC_STORE_URI:
+        start = time.perf_counter()
+        with tracer.span("doc_store_fetch", ids=len(missing)):
+            fetched = get_doc_store().get_many(missing)
+        texts = [text or fetched.get(match['id'], '') for match, text in zip(matches, texts)]
+        print(f"Fetched {len(fetched)} texts ({sum(len(t.encode('utf-8')) for t in fetched.values())} bytes) "
+              f"from document store in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return texts
+
+
+def hybrid_query(query: str, query_embedding: list, top_k: int = 5, include_values: bool = False,
+                 flt: dict = None):
+    """Dense and BM25 candidates fused with reciprocal rank fusion, shaped like an index.query() result"""
+    n_candidates = max(top_k, HYBRID_CANDIDATES)
+    with tracer.span("dense_query", top_k=n_candidates, store=VECTOR_STORE):
+        dense = get_index().query(vector=query_embedding, top_k=n_candidates, include_metadata=True,
+                                  include_values=include_values, filter=flt)
+    matches = {match['id']: match for match in dense.get('matches', [])}
+    with tracer.span("bm25_search", top_k=n_candidates):
+        lexical = [vid for vid, _ in get_bm25_index().search(query, top_k=n_candidates)]
+    fused = reciprocal_rank_fusion([list(matches), lexical], k=RRF_K)
+
+    # Lexical-only hits need their metadata, and a dense score so they sit on the same scale.
+    # Ids the index cannot return (filtered out, or never upserted) are skipped, so the fused
+    # list is walked until top_k usable hits are found rather than cut to top_k up front.
+    q = np.asarray(query_embedding, dtype=np.float32)
+    selected = []
+    lexical_only = 0
+    position = 0
+    while len(selected) < top_k and position < len(fused):
+        window = fused[position:position + top_k - len(selected)]
+        position += len(window)
+        missing = [vid for vid in window if vid not in matches]
+        if missing:
+            with tracer.span("fetch_lexical_only", ids=len(missing)):
+                fetched = get_index().fetch(ids=missing)['vectors']
+            for vid, vector in fetched.items():
+                # BM25 has no metadata, so the recency window is applied here instead of in the index
+                if flt and not matches_filter(vector.get('metadata') or {}, flt):
+                    continue
+                values = np.asarray(vector['values'], dtype=np.float32)
+                norm = np.linalg.norm(values) * np.linalg.norm(q)
+                matches[vid] = {
+                    "id": vid,
+                    "score": float(values @ q / norm) if norm else 0.0,
+                    "metadata": vector.get('metadata') or {},
+                    "values": vector['values'] if include_values else [],
+                }
+                lexical_only += 1
+        selected.extend(vid for vid in window if vid in matches)
+    print(f"Hybrid retrieval: {lexical_only} of top {len(selected)} found by BM25 only")
+    return {"matches": [matches[vid] for vid in selected]}
+
+
+def recency_filter(window_days):
+    """Metadata filter keeping posts newer than window_days, or None for no window"""
+    if not window_days:
+        return None
+    return {"timestamp": {"$gte": int(time.time() - window_days * 86400)}}
+
+
+def as_match(match):
+    """Plain-dict copy of an index match, so scores can be rewritten whatever the backend"""
+    return {
+        "id": match['id'],
+        "score": match['score'],
+        "metadata": match.get('metadata') or {},
+        "values": match.get('values') or [],
+    }
+
+
+def decay_rescore(matches, half_life_days):
+    """Scale each score by 0.5 ** (age / half-life) and re-sort.
+
+    Undated posts and non-positive scores are left alone, so decay never lifts a dissimilar post.
+    """
+    now = time.time()
+    for match in matches:
+        timestamp = match['metadata'].get('timestamp')
+        if isinstance(timestamp, (int, float)) and match['score'] > 0:
+            age_days = max(0.0, now - timestamp) / 86400
+            match['score'] *= 0.5 ** (age_days / half_life_days)
+    return sorted(matches, key=lambda m: m['score'], reverse=True)
+
+
+def query_index(query: str, query_embedding: list, top_k: int, include_values: bool,
+                window_days: float, half_life_days: float):
+    """Dense or hybrid candidates with the recency window applied, decayed if requested.
+
+    Decay can promote a newer post from below the cut, so it over-fetches
+    RECENCY_OVERFETCH x top_k candidates. Hybrid retrieval can only drop
+    BM25-only hits outside the window after fetching them, so it widens the
+    fetch until top_k survive or RECENCY_MAX_FETCH is reached.
+    """
+    start = time.perf_counter()
+    flt = recency_filter(window_days)
+    fetch_k = top_k * RECENCY_OVERFETCH if half_life_days else top_k
+    while True:
+        if RETRIEVAL_MODE == "hybrid":
+            results = hybrid_query(query, query_embedding, fetch_k, include_values=include_values, flt=flt)
+        else:
+            with tracer.span("dense_query", top_k=fetch_k, store=VECTOR_STORE, filtered=flt is not None):
+                results = get_index().query(vector=query_embedding, top_k=fetch_k, include_metadata=True,
+                                            include_values=include_values, filter=flt)
+        matches = [as_match(m) for m in results.get('matches', [])]
+        if len(matches) >= top_k or flt is None or RETRIEVAL_MODE != "hybrid" or fetch_k >= RECENCY_MAX_FETCH:
+            break
+        fetch_k = min(fetch_k * 2, RECENCY_MAX_FETCH)
+
+    if half_life_days:
+        matches = decay_rescore(matches, half_life_days)
+    if flt or half_life_days:
+        print(f"Recency (window {window_days or '-'}d, half-life {half_life_days or '-'}d): "
+              f"{len(matches)} candidates from top_k={fetch_k} in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return matches[:top_k]
+
+
+def _retrieve_top_matches(query: str, top_k: int = 5, rerank: bool = False,
+                          window_days: float = 0, half_life_days: float = 0):
     """Retrieve top matching documents from Pinecone index"""
     try:
-        query_embedding = embedding_model.encode(query).tolist()
-        results = index.query(vector=query_embedding, top_k=top_k, include_metadata=True)
-        
+        query_embedding = embed_query(query)
+        matches = query_index(query, query_embedding, top_k, rerank, window_days, half_life_days)
+
         docs = []
         metadata = []
         original_scores = []
+        doc_values = []
         
-        for match in results.get('matches', []):
-            text_content = (
-                match['metadata'].get('full_text', '') or 
-                match['metadata'].get('text', '') or 
-                match['metadata'].get('content', '')
-            )
-            
+        for match, text_content in zip(matches, match_texts(matches)):
             if text_content:
                 docs.append(text_content)
                 metadata.append({
+                    "id": match['id'],
                     "timestamp": match['metadata'].get('timestamp'),
                     "author": match['metadata'].get('author'),
                     "url": match['metadata'].get('url')
                 })
                 original_scores.append(match['score'])
+                doc_values.append(match.get('values') or [])
         
         # optional reranking
         reranked_scores = original_scores
         if rerank and docs:
-            doc_embeddings = [embedding_model.encode(doc) for doc in docs]
-            reranked_scores = [cosine_similarity([query_embedding], [emb])[0][0] for emb in doc_embeddings]
+            reranked_scores = rerank_scores(query, query_embedding, docs, doc_values)
             reranked = sorted(zip(docs, metadata, original_scores, reranked_scores), key=lambda x: x[3], reverse=True)
             
             if reranked:
@@ -84,12 +499,13 @@ def get_top_matches(query: str, top_k: int = 5, rerank: bool = False):
         
     except Exception as e:
         print(f"Error retrieving matches: {e}")
+        tracer.incr("retrieval_errors")
         return [], [], [], []
 
 
 
 def format_context(docs, metadata):
-    """Format docs + metadata (like timestamp) for the model"""
+    """Format docs + metadata (like timestamp) for the model; the source url is added per group when packing"""
     formatted_chunks = []
     for doc, meta in zip(docs, metadata):
         timestamp = meta.get("timestamp")
@@ -100,34 +516,96 @@ def format_context(docs, metadata):
             ts_str = "Unknown date"
         
         author = meta.get("author", "unknown author")
-        url = meta.get("url", "")
         
-        chunk = f"[Posted on {ts_str} by {author}] {doc}\nSource: {url}"
+        chunk = f"[Posted on {ts_str} by {author}] {doc}"
         formatted_chunks.append(chunk)
     return formatted_chunks
 
+def build_messages(query: str, docs: list, metadata: list):
+    """Chat messages for GPT-4: the question plus packed context, or a no-context fallback.
+
+    docs are expected best first; packing drops near-duplicates, groups chunks by
+    url and stops at CONTEXT_TOKEN_BUDGET. Prompt tokens are logged per query.
+    """
+    stats = None
+    if docs:
+        with tracer.span("pack_context", chunks=len(docs)) as span:
+            context, stats = pack_context(
+                format_context(docs, metadata),
+                [meta.get("url", "") for meta in metadata],
+                budget_tokens=CONTEXT_TOKEN_BUDGET,
+                dedup_threshold=CONTEXT_DEDUP_THRESHOLD
+            )
+            span.update(stats)
+        prompt = f"Question: {query}\n\nContext:\n{context}\n\nAnswer:"
+    else:
+        prompt = f"Question: {query}\n\nPlease provide a helpful answer based on your knowledge."
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant. Use the provided context (including timestamps) to answer questions accurately and reflect recency."},
+        {"role": "user", "content": prompt}
+    ]
+    line = f"Prompt tokens: {count_message_tokens(messages)} for {query[:60]!r}"
+    if stats:
+        line += (f" (context {stats['context_tokens']}/{CONTEXT_TOKEN_BUDGET} tokens, "
+                 f"{stats['packed']}/{stats['candidates']} chunks, {stats['duplicates']} near-duplicates dropped, "
+                 f"{stats['truncated']} truncated)")
+    print(line)
+    return messages
+
 def generate_answer(query: str, docs: list, metadata: list):
-    """Generate answer using GPT-4 with provided context"""
+    """Generate answer using GPT-4 with provided context, reusing semantically cached answers"""
     try:
-        if docs:
-            formatted_chunks = format_context(docs, metadata)
-            context = "\n\n".join(formatted_chunks)
-            prompt = f"Question: {query}\n\nContext:\n{context}\n\nAnswer:"
-        else:
-            prompt = f"Question: {query}\n\nPlease provide a helpful answer based on your knowledge."
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant. Use the provided context (including timestamps) to answer questions accurately and reflect recency."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
+        cached = get_cached_answer(query, docs, metadata)
+        if cached is not None:
+            return cached
+
+        messages = build_messages(query, docs, metadata)
+        with tracer.span("generate", model="gpt-4"):
+            response = get_openai_client().chat.completions.create(
+                model="gpt-4",
+                messages=messages,
+                temperature=0.7
+            )
         
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        store_answer(query, docs, metadata, answer)
+        return answer
         
     except Exception as e:
         print(f"Error generating answer: {e}")
+        tracer.incr("generate_errors")
         return f"Error generating answer: {str(e)}"
 
+def generate_answer_stream(query: str, docs: list, metadata: list):
+    """Stream the GPT-4 answer token by token, logging time-to-first-token"""
+    first_token_at = None
+    try:
+        messages = build_messages(query, docs, metadata)
+        with tracer.span("generate", model="gpt-4", stream=True) as span:
+            start = time.perf_counter()
+            stream = get_openai_client().chat.completions.create(
+                model="gpt-4",
+                messages=messages,
+                temperature=0.7,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        span["first_token_ms"] = round((first_token_at - start) * 1000, 1)
+                        tracer.observe("first_token", first_token_at - start)
+                        print(f"Time to first token: {(first_token_at - start) * 1000:.0f} ms")
+                    yield token
+        print(f"Streamed answer in {(time.perf_counter() - start) * 1000:.0f} ms")
+        
+    except Exception as e:
+        print(f"Error generating answer: {e}")
+        tracer.incr("generate_errors")
+        yield f"Error generating answer: {str(e)}"
+
+
+print(f"rag_utils imported in {time.perf_counter() - _import_start:.2f}s")
@@ -0,0 +1,86 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """LRU cache of generated answers looked up by query-embedding similarity.
+
+    A cached answer is only reused when the new query is within the cosine
+    threshold of a cached one *and* retrieval returned the same documents with
+    the same text, so a paraphrase that pulls different context, or a post
+    re-embedded under its old id after an edit, still goes to the LLM. Entries
+    are also tagged with the index version they were generated against and
+    dropped when the index is refreshed.
+    """
+
+    def __init__(self, max_size=512, threshold=0.92):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.index_version = None
+        self.next_key = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    @staticmethod
+    def context_key(doc_ids, texts):
+        """(id, text digest) per retrieved document, in rank order"""
+        return tuple((doc_id, hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).hexdigest())
+                     for doc_id, text in zip(doc_ids, texts))
+
+    def sync_index_version(self, version):
+        """Drop every entry if the index has been refreshed since they were cached"""
+        with self.lock:
+            if version != self.index_version:
+                if self.entries:
+                    print(f"Index version changed ({self.index_version} -> {version}), "
+                          f"expiring {len(self.entries)} cached answers")
+                self.entries.clear()
+                self.index_version = version
+
+    def get(self, query_embedding, doc_ids, texts):
+        context = self.context_key(doc_ids, texts)
+        q = self._normalize(query_embedding)
+        with self.lock:
+            best_key, best_sim = None, self.threshold
+            for key, (embedding, cached_context, _) in self.entries.items():
+                if cached_context != context:
+                    continue
+                sim = float(embedding @ q)
+                if sim >= best_sim:
+                    best_key, best_sim = key, sim
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(best_key)
+            self.hits += 1
+            return self.entries[best_key][2]
+
+    def put(self, query_embedding, doc_ids, texts, answer):
+        context = self.context_key(doc_ids, texts)
+        with self.lock:
+            self.entries[self.next_key] = (self._normalize(query_embedding), context, answer)
+            self.next_key += 1
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "index_version": self.index_version,
+            }
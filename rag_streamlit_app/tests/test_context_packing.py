@@ -0,0 +1,39 @@
+from context_packing import count_tokens, pack_context
+
+BLEED = ("Rivers of Blood scales with arcane and its weapon skill Corpse Piler builds bleed fast, "
+         "pair it with the Lord of Blood's Exultation talisman for extra attack power")
+MOON = "Moonveil is an intelligence katana whose Transient Moonlight skill fires a beam of light"
+LONG = " ".join(f"filler{i} words about talismans and ashes of war" for i in range(200))
+
+
+def test_context_stays_under_token_budget():
+    chunks = [BLEED, MOON, LONG, LONG + " tail"]
+    for budget in (60, 200, 1000):
+        context, stats = pack_context(chunks, budget_tokens=budget, min_chunk_tokens=16)
+        assert count_tokens(context) <= budget
+        assert stats["context_tokens"] == count_tokens(context)
+
+
+def test_first_chunk_that_does_not_fit_is_truncated():
+    budget = count_tokens(BLEED) + 2 + 40
+    context, stats = pack_context([BLEED, LONG, MOON], budget_tokens=budget, min_chunk_tokens=16)
+    assert context.startswith(BLEED)
+    assert "filler0" in context and "filler199" not in context
+    assert stats["truncated"] == 1 and stats["packed"] == 2
+    # Too little room left: later chunks are skipped, not squeezed in
+    assert MOON not in context
+
+
+def test_near_duplicates_are_dropped():
+    context, stats = pack_context([BLEED, BLEED + " today", MOON], budget_tokens=1000)
+    assert stats == {**stats, "candidates": 3, "duplicates": 1, "packed": 2}
+    assert context.count("Rivers of Blood") == 1
+
+
+def test_chunks_grouped_by_source_url_in_rank_order():
+    urls = ["https://reddit.com/a", "https://reddit.com/b", "https://reddit.com/a"]
+    context, _ = pack_context([BLEED, MOON, "Seppuku adds bleed buildup to any weapon"], urls,
+                              budget_tokens=1000)
+    assert context.count("Source: https://reddit.com/a") == 1
+    assert context.index("reddit.com/a") < context.index("reddit.com/b")
+    assert context.index("Seppuku") < context.index("Moonveil")
@@ -0,0 +1,38 @@
+import query_cache
+from query_cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=10, ttl_seconds=60)
+    cache.put("q", "result")
+    now[0] += 59
+    assert cache.get("q") == "result"
+    now[0] += 2
+    assert cache.get("q") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_put_refreshes_ttl_and_clear_empties(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = LRUCache(ttl_seconds=10)
+    cache.put("q", 1)
+    now[0] = 8
+    cache.put("q", 2)
+    now[0] = 15
+    assert cache.get("q") == 2
+    cache.clear()
+    assert cache.get("q") is None
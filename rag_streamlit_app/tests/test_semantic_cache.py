@@ -0,0 +1,49 @@
+import numpy as np
+
+from semantic_cache import SemanticAnswerCache
+
+QUERY = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+PARAPHRASE = np.array([0.99, 0.1, 0.0], dtype=np.float32)
+UNRELATED = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+IDS = ["p1-body", "p2-c0"]
+TEXTS = ["Bleed builds want arcane", "Use Rivers of Blood"]
+
+
+def test_paraphrase_over_same_context_hits():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(QUERY, IDS, TEXTS, "answer")
+    assert cache.get(PARAPHRASE, IDS, TEXTS) == "answer"
+    assert cache.get(UNRELATED, IDS, TEXTS) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_different_documents_miss():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(QUERY, IDS, TEXTS, "answer")
+    assert cache.get(QUERY, IDS[::-1], TEXTS[::-1]) is None
+
+
+def test_text_edited_under_same_id_misses():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(QUERY, IDS, TEXTS, "answer")
+    assert cache.get(QUERY, IDS, [TEXTS[0], "Use Rivers of Blood (nerfed in 1.10)"]) is None
+
+
+def test_index_version_change_expires_entries():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.sync_index_version(100)
+    cache.put(QUERY, IDS, TEXTS, "answer")
+    cache.sync_index_version(100)
+    assert cache.get(QUERY, IDS, TEXTS) == "answer"
+    cache.sync_index_version(120)
+    assert cache.get(QUERY, IDS, TEXTS) is None
+
+
+def test_lru_evicts_least_recently_used():
+    cache = SemanticAnswerCache(max_size=2, threshold=0.9)
+    cache.put(QUERY, ["a"], ["a"], "first")
+    cache.put(QUERY, ["b"], ["b"], "second")
+    assert cache.get(QUERY, ["a"], ["a"]) == "first"
+    cache.put(QUERY, ["c"], ["c"], "third")
+    assert cache.get(QUERY, ["b"], ["b"]) is None
+    assert cache.get(QUERY, ["a"], ["a"]) == "first"
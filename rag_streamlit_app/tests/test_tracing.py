@@ -0,0 +1,67 @@
+import json
+import logging
+
+import pytest
+
+from tracing import Tracer, count_openai_retries
+
+
+def test_spans_nest_inside_a_trace():
+    tracer = Tracer()
+    with tracer.trace("query", query="bleed") as trace:
+        with tracer.span("retrieve", top_k=5) as span:
+            span["documents"] = 3
+            with tracer.span("embed"):
+                pass
+        tracer.incr("retrieval_cache_miss")
+    assert [(s["name"], s["depth"]) for s in trace["spans"]] == [("query", 0), ("retrieve", 1), ("embed", 2)]
+    assert trace["spans"][1]["documents"] == 3
+    assert trace["counters"] == {"retrieval_cache_miss": 1}
+    assert trace["duration_ms"] >= trace["spans"][1]["duration_ms"]
+    assert tracer.current_trace() is None and list(tracer.traces) == [trace]
+
+
+def test_span_records_errors_and_still_observes():
+    tracer = Tracer()
+    with pytest.raises(ValueError):
+        with tracer.trace("query") as trace:
+            with tracer.span("generate"):
+                raise ValueError("boom")
+    assert trace["spans"][1]["error"] == "ValueError"
+    assert tracer.percentiles()["generate"]["count"] == 1
+
+
+def test_percentiles_over_recent_window():
+    tracer = Tracer(window=100)
+    for ms in range(1, 201):
+        tracer.observe("rerank", ms / 1000)
+    row = tracer.percentiles()["rerank"]
+    assert row["count"] == 200
+    assert row["p50_ms"] == pytest.approx(150.5)
+    assert row["p99_ms"] == pytest.approx(199.01)
+
+
+def test_prometheus_text_and_json_export(tmp_path):
+    tracer = Tracer()
+    tracer.observe("retrieve", 0.25)
+    tracer.incr("answer_cache_hit", 2)
+    text = tracer.prometheus_text()
+    assert 'rag_stage_latency_seconds{stage="retrieve",quantile="0.5"} 0.250000' in text
+    assert 'rag_stage_latency_seconds_count{stage="retrieve"} 1' in text
+    assert 'rag_events_total{event="answer_cache_hit"} 2' in text
+
+    tracer.export(str(tmp_path / "metrics.prom"))
+    assert (tmp_path / "metrics.prom").read_text(encoding="utf-8") == text
+    tracer.export(str(tmp_path / "traces.json"))
+    snapshot = json.loads((tmp_path / "traces.json").read_text(encoding="utf-8"))
+    assert snapshot["counters"] == {"answer_cache_hit": 2}
+
+
+def test_openai_retries_are_counted():
+    tracer = Tracer()
+    count_openai_retries(tracer)
+    count_openai_retries(tracer)
+    logger = logging.getLogger("openai._base_client")
+    logger.info("Retrying request to /chat/completions in 0.5 seconds")
+    logger.info("HTTP Request: POST /chat/completions")
+    assert tracer.counters == {"openai_retries": 1}
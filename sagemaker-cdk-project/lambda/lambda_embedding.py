@@ -11,7 +11,8 @@ def handler(event, context):
             RoleArn=os.environ['SAGEMAKER_ROLE_ARN'],
             ProcessingResources={
                 "ClusterConfig": {
-                    "InstanceCount": 1,
+                    # >1 only helps INGEST_MODE=all: each instance backfills its own shard of the files
+                    "InstanceCount": int(os.environ.get('EMBED_INSTANCE_COUNT', "1")),
                     "InstanceType": "ml.m5.xlarge",
                     "VolumeSizeInGB": 30
                 }
@@ -23,7 +24,15 @@ def handler(event, context):
                 "PINECONE_API_KEY": os.environ['PINECONE_API_KEY'],
                 "INDEX_NAME": os.environ['INDEX_NAME'],
                 "S3_BUCKET_NAME": os.environ['S3_BUCKET_NAME'],
-                "S3_PREFIX": os.environ['S3_PREFIX']
+                "S3_PREFIX": os.environ['S3_PREFIX'],
+                "EMBED_CACHE_PATH": os.environ.get('EMBED_CACHE_PATH', ""),
+                "INGEST_MODE": os.environ.get('INGEST_MODE', "latest"),
+                "EMBED_WORKERS": os.environ.get('EMBED_WORKERS', "1"),
+                "DOC_STORE_URI": os.environ.get('DOC_STORE_URI', ""),
+                "BM25_INDEX_PATH": os.environ.get('BM25_INDEX_PATH', ""),
+                "DEDUP_SIGNATURES_PATH": os.environ.get('DEDUP_SIGNATURES_PATH', ""),
+                "EMBEDDING_BACKEND": os.environ.get('EMBEDDING_BACKEND', "torch"),
+                "EMBEDDING_THREADS": os.environ.get('EMBEDDING_THREADS', "0")
             },
             StoppingCondition={"MaxRuntimeInSeconds": 3600}
         )
@@ -23,7 +23,16 @@ def handler(event, context):
                 "OPENAI_API_KEY": os.environ['OPENAI_API_KEY'],
                 "PINECONE_API_KEY": os.environ['PINECONE_API_KEY'],
                 "INDEX_NAME": os.environ['INDEX_NAME'],
-                "S3_BUCKET_NAME": os.environ['S3_BUCKET_NAME']
+                "S3_BUCKET_NAME": os.environ['S3_BUCKET_NAME'],
+                "EVAL_CONCURRENCY": os.environ.get('EVAL_CONCURRENCY', "4"),
+                "EVAL_MAX_RPM": os.environ.get('EVAL_MAX_RPM', "200"),
+                "DOC_STORE_URI": os.environ.get('DOC_STORE_URI', ""),
+                "BM25_INDEX_PATH": os.environ.get('BM25_INDEX_PATH', ""),
+                "RECENCY_WINDOW_DAYS": os.environ.get('RECENCY_WINDOW_DAYS', "0"),
+                "RECENCY_HALF_LIFE_DAYS": os.environ.get('RECENCY_HALF_LIFE_DAYS', "0"),
+                "EMBEDDING_BACKEND": os.environ.get('EMBEDDING_BACKEND', "torch"),
+                "EMBEDDING_THREADS": os.environ.get('EMBEDDING_THREADS', "0"),
+                "TRACE_EXPORT_PATH": os.environ.get('TRACE_EXPORT_PATH', "")
             },
             StoppingCondition={"MaxRuntimeInSeconds": 3600}
         )